@@ -1,25 +1,65 @@
 from flask import Flask
 from config import Config
 
-def create_app():
+def create_app(config_class=Config):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
 
     # Import and initialize extensions
     from app.models import db, login_manager
-    
+    from app.database import engine_options, init_engine
+
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
     db.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
+    login_manager.blueprint_login_views = {'api': None}  # the API answers 401 instead of redirecting
+    init_engine(app, db)
+
+    from app.cache import support_agents, user_cache
+    support_agents.init_app(app)
+    user_cache.init_app(app)
+
+    from app.assignment import assigner
+    from app.counters import ticket_counters
+    from app.events import ticket_events
+    from app.metrics import request_metrics
+    from app.passwords import passwords
+    from app.profiling import profiler
+    from app.ratelimit import limiter
+    from app.sla import sla
+    passwords.init_app(app)
+    limiter.init_app(app)
+    ticket_events.init_app(app)
+    assigner.init_app(app)
+    sla.init_app(app)
+    profiler.init_app(app)
+    request_metrics.init_app(app)
 
     # Import blueprints
     from app.routes import main
     from app.auth import auth
+    from app.api import api
 
     app.register_blueprint(main)
     app.register_blueprint(auth, url_prefix='/auth')
+    app.register_blueprint(api, url_prefix='/api/v1')
+
+    from app.commands import register_commands
+    register_commands(app)
 
+    from app.schema import schema_lock
     with app.app_context():
-        db.create_all()
+        # one process at a time, so workers starting together don't race on the DDL
+        with schema_lock(db.engine):
+            db.create_all()
+            if app.config['AUTO_UPGRADE_SCHEMA']:
+                from app.schema import upgrade_schema
+                from app.search import ensure_search_index
+                upgrade_schema(db.engine, db.metadata)
+                ensure_search_index(db.engine)
+                ticket_counters.initialize()
+        if app.config['AUTO_ASSIGN']:
+            assigner.rebuild()
 
     return app
@@ -0,0 +1,206 @@
+import hashlib
+from datetime import datetime
+from flask import Blueprint, abort, current_app, jsonify, request, url_for
+from flask_login import current_user, login_required
+from werkzeug.exceptions import HTTPException
+from app.assignment import assigner
+from app.cache import support_agents
+from app.counters import PRIORITIES, STATUSES
+from app.events import publish_ticket
+from app.forms import TicketForm
+from app.models import db, Ticket
+from app.pagination import keyset_paginate
+from app.queries import ticket_list_query, ticket_query
+from app.sla import sla
+
+api = Blueprint('api', __name__)
+
+MAX_PAGE_SIZE = 100
+
+
+@api.errorhandler(HTTPException)
+def http_error(error):
+    response = jsonify(error=error.name, message=error.description)
+    response.status_code = error.code
+    for name, value in error.get_headers():
+        if name != 'Content-Type':
+            response.headers[name] = value
+    return response
+
+
+def ticket_etag(ticket):
+    """Validator for one ticket: changes whenever the ticket is written."""
+    changed = ticket.updated_at or ticket.created_at
+    return '%d-%s' % (ticket.id, changed.strftime('%Y%m%d%H%M%S%f'))
+
+
+def page_etag(tickets, *parts):
+    digest = hashlib.sha1('|'.join([ticket_etag(ticket) for ticket in tickets] + [str(part) for part in parts]).encode())
+    return digest.hexdigest()
+
+
+def not_modified(etag):
+    """A bodiless 304 if the client already holds ``etag``, else None."""
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def user_json(user):
+    return {'id': user.id, 'username': user.username} if user is not None else None
+
+
+def ticket_json(ticket, detail=False):
+    data = {
+        'id': ticket.id,
+        'url': url_for('api.get_ticket', id=ticket.id, _external=True),
+        'title': ticket.title,
+        'summary': ticket.summary,
+        'status': ticket.status,
+        'priority': ticket.priority,
+        'created_at': ticket.created_at.isoformat(),
+        'updated_at': ticket.updated_at.isoformat() if ticket.updated_at else None,
+        'due_at': ticket.due_at.isoformat() if ticket.due_at else None,
+        'client': user_json(ticket.client),
+        'assigned_to': user_json(ticket.support),
+    }
+    if detail:
+        data['description'] = ticket.description
+    return data
+
+
+def ticket_response(ticket, status=200):
+    response = jsonify(ticket_json(ticket, detail=True))
+    response.status_code = status
+    response.set_etag(ticket_etag(ticket))
+    return response
+
+
+def _visible_ticket(id):
+    ticket = ticket_query().filter(Ticket.id == id).first()
+    if ticket is None or (current_user.role != 'support' and ticket.user_id != current_user.id):
+        abort(404)
+    return ticket
+
+
+@api.route('/tickets')
+@login_required
+def list_tickets():
+    query = ticket_list_query()
+    if current_user.role != 'support':
+        query = query.filter(Ticket.user_id == current_user.id)
+    for column, value in ((Ticket.status, request.args.get('status')),
+                          (Ticket.priority, request.args.get('priority'))):
+        if value:
+            query = query.filter(column == value)
+    limit = request.args.get('limit', current_app.config['TICKETS_PER_PAGE'], type=int)
+    try:
+        page = keyset_paginate(query, Ticket.created_at, Ticket.id, per_page=max(1, min(limit, MAX_PAGE_SIZE)),
+                               after=request.args.get('after'), before=request.args.get('before'))
+    except ValueError:
+        abort(400, 'invalid cursor')
+
+    etag = page_etag(page.items, page.next_cursor, page.prev_cursor)
+    unchanged = not_modified(etag)
+    if unchanged is not None:
+        return unchanged
+    args = {key: value for key, value in request.args.items() if key not in ('after', 'before')}
+    links = {}
+    if page.has_next:
+        links['next'] = url_for('api.list_tickets', after=page.next_cursor, _external=True, **args)
+    if page.has_prev:
+        links['prev'] = url_for('api.list_tickets', before=page.prev_cursor, _external=True, **args)
+    response = jsonify(tickets=[ticket_json(ticket) for ticket in page.items],
+                       next_cursor=page.next_cursor, prev_cursor=page.prev_cursor, links=links)
+    response.set_etag(etag)
+    return response
+
+
+@api.route('/queue')
+@login_required
+def work_queue():
+    """Active tickets that are overdue or nearly due, soonest deadline first."""
+    if current_user.role != 'support':
+        abort(403, 'only support staff can read the work queue')
+    limit = request.args.get('limit', 10, type=int)
+    now = datetime.utcnow()
+    tickets = sla.next_up(max(1, min(limit, MAX_PAGE_SIZE)), ticket_list_query(), now)
+    return jsonify(tickets=[dict(ticket_json(ticket), sla_breached=ticket.sla_breached or ticket.due_at <= now,
+                                 overdue_seconds=int((now - ticket.due_at).total_seconds()))
+                            for ticket in tickets])
+
+
+@api.route('/tickets/<int:id>')
+@login_required
+def get_ticket(id):
+    ticket = _visible_ticket(id)
+    unchanged = not_modified(ticket_etag(ticket))
+    if unchanged is not None:
+        return unchanged
+    return ticket_response(ticket)
+
+
+def _json_body():
+    if not request.is_json:
+        abort(415, 'send the request body as application/json')
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(400, 'the request body must be a JSON object')
+    return data
+
+
+@api.route('/tickets', methods=['POST'])
+@login_required
+def create_ticket():
+    data = _json_body()
+    if any(not isinstance(data.get(field, ''), str) for field in ('title', 'description', 'priority')):
+        abort(400, 'title, description and priority must be strings')
+    # Flask-WTF reads a JSON body as form data; CSRF doesn't apply to JSON requests
+    form = TicketForm(meta={'csrf': False})
+    if not form.validate():
+        return jsonify(error='Bad Request', message='invalid ticket', fields=form.errors), 400
+    ticket = Ticket(title=form.title.data, description=form.description.data,
+                    priority=form.priority.data, user_id=current_user.id)
+    assigner.assign(ticket)
+    db.session.add(ticket)
+    db.session.commit()
+    publish_ticket('created', ticket)
+    response = ticket_response(ticket, status=201)
+    response.headers['Location'] = url_for('api.get_ticket', id=ticket.id, _external=True)
+    return response
+
+
+@api.route('/tickets/<int:id>', methods=['PATCH'])
+@login_required
+def update_ticket(id):
+    if current_user.role != 'support':
+        abort(403, 'only support staff can update tickets')
+    data = _json_body()
+    ticket = _visible_ticket(id)
+    # with If-Match the update only applies to the version the client last saw
+    if request.if_match and ticket_etag(ticket) not in request.if_match:
+        abort(412, 'the ticket has changed since it was read')
+
+    errors = {}
+    unknown = set(data) - {'status', 'priority', 'assigned_to'}
+    if unknown:
+        errors.update((field, ['cannot be updated']) for field in sorted(unknown))
+    if 'status' in data and data['status'] not in STATUSES:
+        errors['status'] = ['must be one of %s' % ', '.join(STATUSES)]
+    if 'priority' in data and data['priority'] not in PRIORITIES:
+        errors['priority'] = ['must be one of %s' % ', '.join(PRIORITIES)]
+    assigned_to = data.get('assigned_to')
+    # bool is an int too, and true would otherwise pass as user 1
+    if assigned_to is not None and (not isinstance(assigned_to, int) or isinstance(assigned_to, bool)
+                                    or assigned_to not in dict(support_agents.choices())):
+        errors['assigned_to'] = ['must be the id of a support user or null']
+    if errors:
+        return jsonify(error='Bad Request', message='invalid update', fields=errors), 400
+
+    for field, value in data.items():
+        setattr(ticket, field, value)
+    db.session.commit()
+    publish_ticket('updated', ticket)
+    return ticket_response(ticket)
@@ -0,0 +1,109 @@
+import heapq
+import threading
+import time
+from sqlalchemy import select
+from app.cache import support_agents
+from app.counters import ticket_counters
+from app.models import db
+
+# tickets in these states count towards an agent's load
+ACTIVE_STATUSES = ('open', 'in_progress')
+
+
+class LeastLoadedAssigner:
+    """Picks the support agent with the lowest weighted load of active tickets.
+
+    Loads live in memory with a min-heap of ``(load, agent id)`` over them, so a
+    pick reads the top of the heap instead of counting tickets per agent. When
+    a load changes a new entry is pushed and the old one is left behind; stale
+    entries are discarded when they reach the top (lazy deletion), and the heap
+    is compacted once they outnumber the live ones.
+
+    The loads are built from the ``ticket_counter`` table and then follow the
+    counter deltas of every commit in this process. Changes made by other
+    processes are only seen by a rebuild, which runs before a pick once
+    ``rebuild_interval`` seconds have passed. With several workers keep it at 0
+    (rebuild before every pick, one read of a few dozen rows): otherwise each
+    worker hands its tickets to whoever was least loaded at its last rebuild.
+    Adding or removing a support user also triggers a rebuild on the next pick.
+    """
+
+    def __init__(self, weights=None, rebuild_interval=0):
+        self.enabled = True
+        self.weights = weights or {'high': 3, 'medium': 2, 'low': 1}
+        self.rebuild_interval = rebuild_interval
+        self.picks = 0
+        self.rebuilds = 0
+        self._loads = {}
+        self._heap = []
+        self._generation = None
+        self._rebuild_at = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config['AUTO_ASSIGN']
+        self.weights = app.config['AUTO_ASSIGN_WEIGHTS']
+        self.rebuild_interval = app.config['AUTO_ASSIGN_REBUILD_INTERVAL']
+        self._generation = None
+
+    def weight(self, priority):
+        return self.weights.get(priority, 1)
+
+    def rebuild(self):
+        """Recompute every agent's load from the counters; one query over a few dozen rows."""
+        generation = support_agents.generation
+        loads = dict.fromkeys((id for id, username in support_agents.choices()), 0)
+        c = ticket_counters.table.c
+        rows = db.session.execute(select(c.priority, c.assigned_to, c.count)
+                                  .where(c.status.in_(ACTIVE_STATUSES), c.assigned_to != 0))
+        for priority, agent, count in rows:
+            if agent in loads:
+                loads[agent] += self.weight(priority) * count
+        heap = [(load, agent) for agent, load in loads.items()]
+        heapq.heapify(heap)
+        with self._lock:
+            self._loads, self._heap = loads, heap
+            self._generation = generation
+            self._rebuild_at = time.monotonic() + self.rebuild_interval
+            self.rebuilds += 1
+
+    def pick(self):
+        """The id of the least loaded support agent (lowest id on a tie), or None if there is none."""
+        if self._generation != support_agents.generation or time.monotonic() >= self._rebuild_at:
+            self.rebuild()
+        with self._lock:
+            self.picks += 1
+            while self._heap:
+                load, agent = self._heap[0]
+                if self._loads.get(agent) == load:
+                    return agent
+                heapq.heappop(self._heap)
+        return None
+
+    def assign(self, ticket):
+        """Give an unassigned ``ticket`` to the least loaded agent; its load goes up once the ticket commits."""
+        if self.enabled and ticket.assigned_to is None:
+            ticket.assigned_to = self.pick()
+        return ticket.assigned_to
+
+    def apply(self, deltas):
+        """Follow committed counter deltas (``{(status, priority, assigned_to): n}``)."""
+        with self._lock:
+            for (status, priority, agent), delta in deltas.items():
+                if status in ACTIVE_STATUSES and agent in self._loads:
+                    self._loads[agent] += self.weight(priority) * delta
+                    heapq.heappush(self._heap, (self._loads[agent], agent))
+            if len(self._heap) > 2 * len(self._loads) + 16:
+                self._heap = [(load, agent) for agent, load in self._loads.items()]
+                heapq.heapify(self._heap)
+
+    def loads(self):
+        with self._lock:
+            return dict(self._loads)
+
+    def stats(self):
+        return {'agents': len(self._loads), 'heap': len(self._heap), 'picks': self.picks, 'rebuilds': self.rebuilds}
+
+
+assigner = LeastLoadedAssigner()
+ticket_counters.on_commit(assigner.apply)
@@ -2,10 +2,20 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
 from app.models import db, User
 from app.forms import LoginForm, RegistrationForm
+from app.passwords import HasherBusy
+from app.ratelimit import limiter
 
 auth = Blueprint('auth', __name__)
 
+@auth.errorhandler(HasherBusy)
+def hasher_busy(error):
+    flash('The server is busy, please try again in a moment.')
+    if request.endpoint == 'auth.register':
+        return render_template('register.html', form=RegistrationForm()), 503, {'Retry-After': '1'}
+    return render_template('login.html', form=LoginForm()), 503, {'Retry-After': '1'}
+
 @auth.route('/login', methods=['GET', 'POST'])
+@limiter.limit('login')
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('main.index'))
@@ -13,6 +23,7 @@ def login():
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
         if user and user.check_password(form.password.data):
+            db.session.commit()  # saves a hash upgraded by check_password
             login_user(user)
             next_page = request.args.get('next')
             return redirect(next_page) if next_page else redirect(url_for('main.index'))
@@ -26,6 +37,7 @@ def logout():
     return redirect(url_for('main.index'))
 
 @auth.route('/register', methods=['GET', 'POST'])
+@limiter.limit('register')
 def register():
     if current_user.is_authenticated:
         return redirect(url_for('main.index'))
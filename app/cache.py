@@ -0,0 +1,229 @@
+import functools
+import json
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+from app.models import db, User
+
+
+class SupportAgentCache:
+    """In-process cache of ``(id, username)`` for support users.
+
+    Backs the assignment dropdown on the ticket page, which otherwise loads every
+    support ``User`` row on each request. Entries live for ``ttl`` seconds and are
+    dropped as soon as a commit in this process adds, removes or re-roles a user;
+    other processes see the change when their entry expires.
+    """
+
+    def __init__(self, ttl=5):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._choices = None
+        self._expires = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config['SUPPORT_AGENT_CACHE_TTL']
+
+    def choices(self):
+        choices = self._choices
+        if choices is not None and time.monotonic() < self._expires:
+            self.hits += 1
+            return list(choices)
+        with self._lock:
+            self.misses += 1
+            generation = self._generation
+            rows = db.session.query(User.id, User.username).filter_by(role='support').order_by(User.id).all()
+            choices = [(id, username) for id, username in rows]
+            # an invalidation that raced with the query wins; serve the rows but don't keep them
+            if generation == self._generation:
+                self._choices = choices
+                self._expires = time.monotonic() + self.ttl
+        return list(choices)
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._choices = None
+
+    @property
+    def generation(self):
+        """Goes up whenever the set of support users may have changed."""
+        return self._generation
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._choices) if self._choices is not None else 0}
+
+
+support_agents = SupportAgentCache()
+
+
+class LRUBackend:
+    """Bounded in-process LRU; entries expire ``ttl`` seconds after being stored."""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if time.monotonic() >= expires:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SharedBackend:
+    """Cache shared between worker processes through a Redis-style client.
+
+    Any object with ``get``, ``setex`` and ``delete`` will do, so a local stand-in
+    can replace the server in benchmarks and development.
+    """
+
+    def __init__(self, client, ttl=300, prefix='supportportal:user:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + str(key))
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value):
+        self.client.setex(self.prefix + str(key), self.ttl, json.dumps(value))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + str(key))
+
+
+class NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+
+def make_backend(config):
+    kind = config['USER_CACHE_BACKEND']
+    if kind == 'none':
+        return NullBackend()
+    if kind == 'lru':
+        return LRUBackend(config['USER_CACHE_SIZE'], config['USER_CACHE_TTL'])
+    if kind == 'redis':
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError('USER_CACHE_BACKEND=redis requires the redis package') from exc
+        return SharedBackend(redis.Redis.from_url(config['USER_CACHE_URL']), config['USER_CACHE_TTL'])
+    raise ValueError('unknown USER_CACHE_BACKEND %r' % kind)
+
+
+class UserCache:
+    """Identity cache behind Flask-Login's ``user_loader``.
+
+    Only the columns the pages read are cached, never the password hash. A hit
+    is rebuilt into a detached ``User`` and merged into the request session
+    without a SELECT; anything not cached (e.g. ``password_hash``) is loaded on
+    first access. Any committed update or delete of a user evicts its entry.
+    """
+
+    fields = ('id', 'username', 'email', 'role')
+
+    def __init__(self, db, model, backend=None):
+        self.db = db
+        self.model = model
+        self.backend = backend or LRUBackend()
+        self.hits = 0
+        self.misses = 0
+        event.listen(model, 'after_update', self._user_changed)
+        event.listen(model, 'after_delete', self._user_changed)
+
+    def init_app(self, app):
+        self.backend = make_backend(app.config)
+        self.hits = self.misses = 0
+
+    def load(self, user_id):
+        data = self.backend.get(user_id)
+        if data is None:
+            self.misses += 1
+            user = self.db.session.get(self.model, user_id)
+            if user is not None:
+                self.backend.set(user_id, {field: getattr(user, field) for field in self.fields})
+            return user
+        self.hits += 1
+        user = self.model(**data)
+        make_transient_to_detached(user)
+        return self.db.session.merge(user, load=False)
+
+    def invalidate(self, user_id):
+        self.backend.delete(user_id)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def _user_changed(self, mapper, connection, user):
+        _queue_invalidation(user, functools.partial(self.invalidate, user.id))
+
+
+user_cache = UserCache(db, User)
+
+
+# Invalidations are queued on the session during flush and applied only once the
+# transaction commits, so a concurrent reader can't re-cache pre-commit rows.
+
+def _queue_invalidation(user, callback):
+    session = object_session(user)
+    if session is not None:
+        session.info.setdefault('cache_invalidations', set()).add(callback)
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_delete')
+def _support_user_added_or_removed(mapper, connection, user):
+    if user.role == 'support':
+        _queue_invalidation(user, support_agents.invalidate)
+
+
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, user):
+    state = inspect(user)
+    if state.attrs.role.history.has_changes() or state.attrs.username.history.has_changes():
+        _queue_invalidation(user, support_agents.invalidate)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_invalidations(session):
+    for callback in session.info.pop('cache_invalidations', ()):
+        callback()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop('cache_invalidations', None)
@@ -0,0 +1,116 @@
+import json
+import os
+import sys
+import click
+from flask.cli import with_appcontext
+from app.counters import ticket_counters
+from app.export import FORMATS, export_tickets
+from app.importer import TicketImporter, read_rows
+from app.models import db
+from app.schema import schema_lock, upgrade_schema
+from app.search import ensure_search_index, rebuild_search_index, uses_fts
+from app.sla import sla
+
+
+@click.command('upgrade-schema')
+@with_appcontext
+def upgrade_schema_command():
+    """Bring an existing database up to the declared columns and indexes."""
+    with schema_lock(db.engine):
+        changes = upgrade_schema(db.engine, db.metadata)
+        if ensure_search_index(db.engine):
+            changes.append('created search index ticket_fts')
+        if ticket_counters.initialize():
+            changes.append('filled ticket counters')
+    for change in changes:
+        click.echo(change)
+    click.echo('schema up to date' if not changes else '%d change(s) applied' % len(changes))
+
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """Re-index every ticket for full-text search."""
+    if not uses_fts(db.engine):
+        raise click.ClickException('full-text search needs SQLite FTS5; other databases use LIKE matching')
+    if not ensure_search_index(db.engine):
+        rebuild_search_index(db.engine)
+    click.echo('search index rebuilt')
+
+
+@click.command('reconcile-counters')
+@with_appcontext
+def reconcile_counters_command():
+    """Recompute the dashboard ticket counters from the ticket table."""
+    changes = ticket_counters.reconcile()
+    for (status, priority, assigned_to), stored, actual in changes:
+        click.echo('%s/%s/assignee %d: %d -> %d' % (status, priority, assigned_to, stored, actual))
+    click.echo('counters up to date' if not changes else '%d counter(s) corrected' % len(changes))
+
+
+@click.command('export-tickets')
+@click.option('--format', 'format', type=click.Choice(sorted(FORMATS)), default='csv', show_default=True)
+@click.option('--status', help='only tickets with this status')
+@click.option('--since', type=click.DateTime(), help='created on or after this date')
+@click.option('--until', type=click.DateTime(), help='created before this date')
+@click.option('--gzip', 'compress', is_flag=True, help='gzip the output')
+@click.option('--batch-size', default=1000, show_default=True, help='rows fetched per round trip')
+@click.option('-o', '--output', type=click.Path(dir_okay=False, writable=True), help='file to write (default: stdout)')
+@with_appcontext
+def export_tickets_command(format, status, since, until, compress, batch_size, output):
+    """Stream tickets with client and assignee usernames as CSV or NDJSON."""
+    out = open(output, 'wb') if output else sys.stdout.buffer
+    try:
+        for chunk in export_tickets(format, status, since, until, compress, batch_size):
+            out.write(chunk)
+    finally:
+        if output:
+            out.close()
+
+
+@click.command('import-tickets')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'format', type=click.Choice(sorted(FORMATS)), help='default: from the file name')
+@click.option('--batch-size', default=5000, show_default=True, help='rows per INSERT transaction')
+@click.option('--checkpoint', help='name the progress is saved under (default: the absolute PATH)')
+@click.option('--rejects', type=click.File('w'), help='write rejected records here as NDJSON')
+@with_appcontext
+def import_tickets_command(path, format, batch_size, checkpoint, rejects):
+    """Bulk import tickets from CSV or NDJSON, resuming where an interrupted run stopped.
+
+    Records use the export's columns; client and assigned_to are usernames.
+    """
+    def on_reject(position, record, errors):
+        if rejects is not None:
+            rejects.write(json.dumps({'record': position, 'errors': errors, 'data': record}, default=str) + '\n')
+
+    def on_progress(state, rate):
+        click.echo('%d imported, %d rejected, %.0f rows/s' % (state['imported'], state['rejected'], rate))
+
+    checkpoint = checkpoint or os.path.abspath(path)
+    importer = TicketImporter(batch_size, checkpoint, on_reject, on_progress)
+    resumed = importer.checkpoint.load()['position']
+    if resumed:
+        click.echo('resuming after record %d' % resumed)
+    state = importer.run(read_rows(path, format))
+    click.echo('done: %d imported, %d rejected' % (state['imported'], state['rejected']))
+
+
+@click.command('sla-sweep')
+@click.option('--batch-size', type=int, help='tickets per commit (default: SLA_SWEEP_BATCH)')
+@with_appcontext
+def sla_sweep_command(batch_size):
+    """Flag active tickets that are past their SLA due date."""
+    filled, flagged = sla.sweep(batch_size=batch_size)
+    if filled:
+        click.echo('%d due date(s) filled in' % filled)
+    click.echo('%d ticket(s) flagged as breached' % flagged)
+
+
+def register_commands(app):
+    app.cli.add_command(upgrade_schema_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(reconcile_counters_command)
+    app.cli.add_command(export_tickets_command)
+    app.cli.add_command(import_tickets_command)
+    app.cli.add_command(sla_sweep_command)
@@ -0,0 +1,177 @@
+from collections import Counter
+from sqlalchemy import event, func, inspect, literal, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import db, Ticket
+
+STATUSES = ('open', 'in_progress', 'closed')
+PRIORITIES = ('high', 'medium', 'low')
+
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+class CounterSummary:
+    """Ticket counts by status, by priority and status, and by assignee and status."""
+
+    def __init__(self, rows):
+        self.total = 0
+        self.status = Counter()
+        self.priority = {}
+        self.assignee = {}
+        for status, priority, assigned_to, count in rows:
+            self.total += count
+            self.status[status] += count
+            self.priority.setdefault(priority, Counter())[status] += count
+            self.assignee.setdefault(assigned_to, Counter())[status] += count
+
+
+class TicketCounters:
+    """Ticket counts kept in a ``ticket_counter`` table as tickets are written.
+
+    A row per ``(status, priority, assigned_to)`` holds how many tickets have
+    those values (``assigned_to`` is 0 for unassigned tickets), so dashboards
+    read a table with a few dozen rows instead of grouping every ticket. The
+    rows are adjusted in the same transaction as the ticket change, from a
+    ``before_flush`` hook, so they commit or roll back with it. Writes that
+    bypass the session (bulk UPDATEs, raw SQL) are not seen; ``reconcile()``
+    recomputes everything from the ticket table.
+
+    Functions passed to ``on_commit`` are called with the deltas of each
+    committed transaction, so in-memory views can follow the counts.
+    """
+
+    dimensions = ('status', 'priority', 'assigned_to')
+
+    def __init__(self, db, model):
+        self.db = db
+        self.model = model
+        self.table = db.Table(
+            'ticket_counter',
+            db.Column('status', db.String(20), primary_key=True),
+            db.Column('priority', db.String(20), primary_key=True),
+            db.Column('assigned_to', db.Integer, primary_key=True, autoincrement=False),
+            db.Column('count', db.Integer, nullable=False, default=0),
+        )
+        # models without an assignee column count every ticket as unassigned
+        self.tracked = [name for name in self.dimensions if name in model.__table__.c]
+        for name in self.tracked:
+            # load the previous value when an attribute is set, so it can be decremented
+            event.listen(getattr(model, name), 'set', _keep_old_value, active_history=True)
+        self.listeners = []
+        event.listen(Session, 'before_flush', self._before_flush)
+        event.listen(Session, 'after_commit', self._after_commit)
+        event.listen(Session, 'after_rollback', self._after_rollback)
+
+    def _key(self, ticket, old=False):
+        values = dict.fromkeys(self.dimensions, 0)
+        for name in self.tracked:
+            value = getattr(ticket, name)
+            if old:
+                history = inspect(ticket).attrs[name].history
+                if history.deleted:
+                    value = history.deleted[0]
+            if value is None:
+                # column defaults of pending tickets are only applied by the INSERT
+                default = self.model.__table__.c[name].default
+                value = default.arg if default is not None and default.is_scalar else None
+            values[name] = value
+        return values['status'], values['priority'], values['assigned_to'] or 0
+
+    def _before_flush(self, session, flush_context, instances):
+        deltas = Counter()
+        for ticket in session.new:
+            if isinstance(ticket, self.model):
+                deltas[self._key(ticket)] += 1
+        for ticket in session.dirty:
+            if isinstance(ticket, self.model):
+                deltas[self._key(ticket, old=True)] -= 1
+                deltas[self._key(ticket)] += 1
+        for ticket in session.deleted:
+            if isinstance(ticket, self.model):
+                deltas[self._key(ticket, old=True)] -= 1
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if deltas:
+            self.record(session, deltas)
+
+    def _after_commit(self, session):
+        deltas = session.info.pop('ticket_counter_deltas', None)
+        if deltas:
+            for listener in self.listeners:
+                listener(deltas)
+
+    def _after_rollback(self, session):
+        session.info.pop('ticket_counter_deltas', None)
+
+    def on_commit(self, listener):
+        self.listeners.append(listener)
+        return listener
+
+    def record(self, session, deltas):
+        """Apply ``deltas`` in the session's transaction and pass them to the listeners once it commits."""
+        self.apply(session.connection(), deltas)
+        session.info.setdefault('ticket_counter_deltas', Counter()).update(deltas)
+
+    def apply(self, connection, deltas):
+        """Add ``deltas`` (``{(status, priority, assigned_to): n}``) to the stored counts.
+
+        Rows are updated in key order so concurrent writers lock them in the same
+        order. A missing row is inserted; if another transaction inserted it
+        first, the update is retried.
+        """
+        c = self.table.c
+        for (status, priority, assigned_to), delta in sorted(deltas.items()):
+            update = (self.table.update()
+                      .where(c.status == status, c.priority == priority, c.assigned_to == assigned_to)
+                      .values(count=c.count + delta))
+            if connection.execute(update).rowcount:
+                continue
+            try:
+                with connection.begin_nested():
+                    connection.execute(self.table.insert().values(
+                        status=status, priority=priority, assigned_to=assigned_to, count=delta))
+            except IntegrityError:
+                connection.execute(update)
+
+    def summary(self):
+        c = self.table.c
+        rows = self.db.session.execute(
+            select(c.status, c.priority, c.assigned_to, c.count).where(c.count != 0))
+        return CounterSummary(rows)
+
+    def _actual(self):
+        columns = [self.model.__table__.c[name] if name in self.tracked else literal(0)
+                   for name in self.dimensions]
+        columns[2] = func.coalesce(columns[2], 0)
+        rows = self.db.session.execute(select(*columns, func.count()).group_by(*columns))
+        return {(status, priority, assigned_to): count for status, priority, assigned_to, count in rows}
+
+    def reconcile(self):
+        """Recompute every count from the ticket table; returns the keys that were wrong.
+
+        Each change is ``((status, priority, assigned_to), stored, actual)``.
+        """
+        c = self.table.c
+        stored = {(status, priority, assigned_to): count for status, priority, assigned_to, count
+                  in self.db.session.execute(select(c.status, c.priority, c.assigned_to, c.count))}
+        actual = self._actual()
+        changes = [(key, stored.get(key, 0), actual.get(key, 0)) for key in sorted(set(stored) | set(actual))
+                   if stored.get(key, 0) != actual.get(key, 0)]
+        self.db.session.execute(self.table.delete())
+        if actual:
+            self.db.session.execute(self.table.insert(), [
+                {'status': status, 'priority': priority, 'assigned_to': assigned_to, 'count': count}
+                for (status, priority, assigned_to), count in actual.items()])
+        self.db.session.commit()
+        return changes
+
+    def initialize(self):
+        """Fill the counters on a database that has tickets but no counts yet."""
+        if self.db.session.execute(select(self.table).limit(1)).first() is None:
+            if self.db.session.execute(select(self.model.id).limit(1)).first() is not None:
+                return self.reconcile()
+        return []
+
+
+ticket_counters = TicketCounters(db, Ticket)
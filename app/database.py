@@ -0,0 +1,172 @@
+import threading
+import time
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+# Pragmas run on every new SQLite connection, by profile name.
+#   wal   - readers don't block the writer and vice versa; a commit appends to the
+#           log instead of fsyncing the database (synchronous=NORMAL is durable
+#           against application crashes, the last commits can be lost on power
+#           loss); writers wait up to busy_timeout ms for the lock instead of
+#           failing with "database is locked"
+#   none  - the driver's defaults (rollback journal, full fsync on commit)
+SQLITE_PROFILES = {
+    'wal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -20000,  # negative means KiB, so 20 MB of page cache
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+    },
+    'none': {},
+}
+
+
+def sqlite_pragmas(config):
+    """The pragmas for ``SQLITE_PROFILE`` with ``SQLITE_PRAGMAS`` applied on top."""
+    profile = config['SQLITE_PROFILE']
+    if profile not in SQLITE_PROFILES:
+        raise ValueError('unknown SQLITE_PROFILE %r' % profile)
+    return dict(SQLITE_PROFILES[profile], **config['SQLITE_PRAGMAS'])
+
+
+def configure_sqlite(engine, pragmas):
+    """Run ``pragmas`` on each connection ``engine`` opens. A no-op for other databases."""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA %s = %s' % (name, value))
+        cursor.close()
+
+
+class MeteredQueuePool(QueuePool):
+    """``QueuePool`` that also records how long checkouts wait for a connection.
+
+    Waiting covers blocking on an exhausted pool as well as opening a new
+    connection. Counters are per pool, so per worker process; ``dispose()``
+    starts a fresh pool with fresh counters.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self._metrics_lock = threading.Lock()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            with self._metrics_lock:
+                self.timeouts += 1
+            raise
+        waited = time.perf_counter() - started
+        with self._metrics_lock:
+            self.checkouts += 1
+            self.wait_time += waited
+            self.max_wait = max(self.max_wait, waited)
+        return connection
+
+    def stats(self):
+        return {'size': self.size(), 'checked_out': self.checkedout(), 'checked_in': self.checkedin(),
+                'overflow': max(self.overflow(), 0), 'checkouts': self.checkouts, 'timeouts': self.timeouts,
+                'wait_mean_ms': self.wait_time / self.checkouts * 1000 if self.checkouts else 0.0,
+                'wait_max_ms': self.max_wait * 1000}
+
+
+# Pool defaults by dialect, overridden by the DB_* settings in config.py and then
+# by anything set explicitly in SQLALCHEMY_ENGINE_OPTIONS. Server connections are
+# pre-pinged and recycled after 30 minutes, so ones dropped by the server, a
+# proxy or a failover are replaced instead of failing a request. pool_timeout is
+# short so a spike fails fast instead of queueing until the worker times out.
+POOL_DEFAULTS = {
+    'postgresql': {'pool_size': 10, 'max_overflow': 20, 'pool_timeout': 10,
+                   'pool_recycle': 1800, 'pool_pre_ping': True},
+    'mysql': {'pool_size': 10, 'max_overflow': 20, 'pool_timeout': 10,
+              'pool_recycle': 1800, 'pool_pre_ping': True},
+    # SQLAlchemy's own defaults for file databases
+    'sqlite': {'pool_size': 5, 'max_overflow': 10, 'pool_timeout': 30},
+}
+
+POOL_SETTINGS = {
+    'DB_POOL_SIZE': ('pool_size', int),
+    'DB_MAX_OVERFLOW': ('max_overflow', int),
+    'DB_POOL_TIMEOUT': ('pool_timeout', int),  # whole seconds, as engine_from_config coerces it
+    'DB_POOL_RECYCLE': ('pool_recycle', int),
+    'DB_POOL_PRE_PING': ('pool_pre_ping', lambda value: str(value).lower() not in ('0', 'false', 'no')),
+}
+
+# Statements running longer than a gunicorn worker's timeout only hold a
+# connection for a response nobody will receive.
+STATEMENT_TIMEOUT_DEFAULTS = {'postgresql': 30000, 'mysql': 30000}
+
+
+def _backend(config):
+    return make_url(config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+
+
+def _in_memory(config):
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(config):
+    """``SQLALCHEMY_ENGINE_OPTIONS`` with the connection pool settings filled in.
+
+    Known dialects get a ``MeteredQueuePool``. In-memory SQLite is left to
+    Flask-SQLAlchemy, which needs a single shared connection for it.
+    """
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    backend = _backend(config)
+    if backend not in POOL_DEFAULTS or _in_memory(config):
+        return options
+    pool = dict(POOL_DEFAULTS[backend], poolclass=MeteredQueuePool)
+    for setting, (option, convert) in POOL_SETTINGS.items():
+        if config.get(setting) not in (None, ''):
+            pool[option] = convert(config[setting])
+    pool.update(options)
+    return pool
+
+
+def statement_timeout(config):
+    """Milliseconds from ``DB_STATEMENT_TIMEOUT`` or the dialect default; 0 disables it."""
+    value = config.get('DB_STATEMENT_TIMEOUT')
+    if value in (None, ''):
+        return STATEMENT_TIMEOUT_DEFAULTS.get(_backend(config), 0)
+    return int(value)
+
+
+def configure_statement_timeout(engine, milliseconds):
+    """Cap statement run time on each new connection (PostgreSQL, and MySQL SELECTs)."""
+    statements = {'postgresql': 'SET statement_timeout = %d',
+                  'mysql': 'SET SESSION max_execution_time = %d'}
+    statement = statements.get(engine.dialect.name)
+    if statement is None or not milliseconds:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_statement_timeout(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(statement % milliseconds)
+        cursor.close()
+
+
+def pool_stats(engine):
+    """Current pool metrics, or an empty dict if the engine's pool isn't metered."""
+    stats = getattr(engine.pool, 'stats', None)
+    return stats() if stats is not None else {}
+
+
+def init_engine(app, db):
+    with app.app_context():
+        configure_sqlite(db.engine, sqlite_pragmas(app.config))
+        configure_statement_timeout(db.engine, statement_timeout(app.config))
@@ -0,0 +1,168 @@
+import json
+import threading
+import time
+from collections import deque
+from flask import url_for
+
+
+class Subscription:
+    """One listener's queue of pending messages, at most ``maxsize`` long.
+
+    A listener that falls that far behind is dropped rather than allowed to
+    grow the queue: its pending messages are discarded and ``dropped`` is set,
+    so the stream can tell the browser to reload instead.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.dropped = False
+        self._messages = deque()
+        self._ready = threading.Condition(threading.Lock())
+
+    def push(self, message):
+        with self._ready:
+            if self.dropped:
+                return False
+            if len(self._messages) >= self.maxsize:
+                self.dropped = True
+                self._messages.clear()
+            else:
+                self._messages.append(message)
+            self._ready.notify()
+            return not self.dropped
+
+    def get(self, timeout):
+        """The next message, or None if nothing arrived within ``timeout`` seconds or the listener was dropped."""
+        with self._ready:
+            if not self._messages and not self.dropped:
+                self._ready.wait(timeout)
+            return self._messages.popleft() if self._messages else None
+
+
+class EventBroker:
+    """In-process publish/subscribe of ticket changes for Server-Sent Events streams.
+
+    ``publish`` formats a message once and hands it to every subscriber without
+    blocking: each has its own bounded queue and a subscriber whose queue is
+    full is dropped. The last ``queue_size`` messages are kept so a reconnecting
+    browser that sends ``Last-Event-ID`` gets what it missed. Subscribers only
+    see events published by the same process.
+    """
+
+    def __init__(self, queue_size=100, heartbeat=15, max_subscribers=100, stream_timeout=300):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self.stream_timeout = stream_timeout
+        self.published = 0
+        self.dropped = 0
+        self._last_id = 0
+        self._history = deque(maxlen=queue_size)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.queue_size = app.config['SSE_QUEUE_SIZE']
+        self.heartbeat = app.config['SSE_HEARTBEAT']
+        self.max_subscribers = app.config['SSE_MAX_SUBSCRIBERS']
+        self.stream_timeout = app.config['SSE_STREAM_TIMEOUT']
+        self._history = deque(maxlen=self.queue_size)
+
+    def publish(self, event, data):
+        with self._lock:
+            self._last_id += 1
+            message = 'id: %d\nevent: %s\ndata: %s\n\n' % (self._last_id, event, json.dumps(data))
+            self._history.append((self._last_id, message))
+            subscribers = list(self._subscribers)
+            self.published += 1
+        for subscription in subscribers:
+            if not subscription.push(message):
+                self.unsubscribe(subscription)
+
+    def subscribe(self, last_event_id=None):
+        """A new subscription, or None when ``max_subscribers`` are already listening.
+
+        With ``last_event_id`` the messages published since are queued first; if
+        they are no longer all kept the subscription starts out dropped.
+        """
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            if last_event_id is not None:
+                oldest = self._history[0][0] if self._history else self._last_id + 1
+                # ids restart with the process, so one from the future is as unknown as one too old
+                if last_event_id < oldest - 1 or last_event_id > self._last_id:
+                    subscription.dropped = True
+                for id, message in self._history:
+                    if id > last_event_id:
+                        subscription.push(message)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.discard(subscription)
+                if subscription.dropped:
+                    self.dropped += 1
+
+    def stream(self, subscription):
+        """The ``text/event-stream`` body for ``subscription``, ending after ``stream_timeout`` seconds.
+
+        A comment line goes out after ``heartbeat`` idle seconds so proxies keep
+        the connection open and a closed one is noticed. A dropped subscriber is
+        sent a ``reset`` event and the stream ends.
+        """
+        ends = time.monotonic() + self.stream_timeout
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                remaining = ends - time.monotonic()
+                if remaining <= 0:
+                    return
+                message = subscription.get(min(self.heartbeat, remaining))
+                if message is not None:
+                    yield message
+                elif subscription.dropped:
+                    yield 'event: reset\ndata: {}\n\n'
+                    return
+                else:
+                    yield ': ping\n\n'
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        return {'subscribers': len(self._subscribers), 'published': self.published, 'dropped': self.dropped}
+
+
+ticket_events = EventBroker()
+
+
+def can_stream(environ):
+    """Whether the server handling ``environ`` can hold a stream open and still serve other requests.
+
+    Gunicorn's sync worker (and Werkzeug without threads) handles one request at
+    a time, so a stream would block the worker until gunicorn kills it.
+    """
+    return bool(environ.get('wsgi.multithread'))
+
+
+def ticket_event_data(ticket):
+    return {
+        'id': ticket.id,
+        'url': url_for('main.ticket_detail', id=ticket.id),
+        'title': ticket.title,
+        'client': ticket.client.username,
+        'status': ticket.status,
+        'priority': ticket.priority,
+        'assigned_to': ticket.support.username if ticket.support else None,
+        'created_at': ticket.created_at.strftime('%Y-%m-%d'),
+        'comment_count': ticket.comment_count,
+        'last_activity_at': ticket.last_activity_at.strftime('%Y-%m-%d %H:%M'),
+    }
+
+
+def publish_ticket(event, ticket):
+    """Tell the live dashboards that ``ticket`` was ``created`` or ``updated``; call after the commit."""
+    ticket_events.publish(event, ticket_event_data(ticket))
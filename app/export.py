@@ -0,0 +1,84 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from app.models import db, Ticket, User
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+FIELDS = ('id', 'title', 'description', 'status', 'priority', 'created_at', 'updated_at', 'client', 'assigned_to')
+
+
+def parse_date(value):
+    """``YYYY-MM-DD`` or an ISO datetime; raises ``ValueError`` otherwise."""
+    return datetime.fromisoformat(value) if value else None
+
+
+def export_statement(status=None, since=None, until=None):
+    """Tickets oldest first with their client's and assignee's usernames.
+
+    ``since`` is inclusive and ``until`` exclusive, both compared to ``created_at``.
+    """
+    client = aliased(User)
+    support = aliased(User)
+    statement = (select(Ticket.id, Ticket.title, Ticket.description, Ticket.status, Ticket.priority,
+                        Ticket.created_at, Ticket.updated_at,
+                        client.username.label('client'), support.username.label('assigned_to'))
+                 .join(client, Ticket.user_id == client.id)
+                 .outerjoin(support, Ticket.assigned_to == support.id)
+                 .order_by(Ticket.created_at, Ticket.id))
+    if status:
+        statement = statement.where(Ticket.status == status)
+    if since:
+        statement = statement.where(Ticket.created_at >= since)
+    if until:
+        statement = statement.where(Ticket.created_at < until)
+    return statement
+
+
+def export_batches(statement, batch_size=1000):
+    """Run ``statement`` on a server-side cursor, yielding lists of at most ``batch_size`` rows."""
+    result = db.session.execute(statement, execution_options={'yield_per': batch_size})
+    for batch in result.partitions():
+        yield batch
+
+
+def csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def ndjson_chunks(batches):
+    for batch in batches:
+        yield ''.join(json.dumps(dict(zip(FIELDS, map(_json_value, row)))) + '\n' for row in batch).encode()
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzip a stream of byte chunks as they come, never holding more than one."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 16+15 writes a gzip header
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_tickets(format='csv', status=None, since=None, until=None, compress=False, batch_size=1000):
+    """Byte chunks of the export; memory use depends on ``batch_size``, not on the number of tickets."""
+    batches = export_batches(export_statement(status, since, until), batch_size)
+    chunks = csv_chunks(batches) if format == 'csv' else ndjson_chunks(batches)
+    return gzip_chunks(chunks) if compress else chunks
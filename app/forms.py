@@ -21,6 +21,10 @@ class TicketForm(FlaskForm):
     priority = SelectField('Priority', choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High')], default='medium')
     submit = SubmitField('Submit Ticket')
 
+class CommentForm(FlaskForm):
+    body = TextAreaField('Reply', validators=[DataRequired(), Length(max=10000)])
+    submit = SubmitField('Post Reply')
+
 class UpdateTicketForm(FlaskForm):
     status = SelectField('Status', choices=[('open', 'Open'), ('in_progress', 'In Progress'), ('closed', 'Closed')])
     assigned_to = SelectField('Assign to', coerce=int)
@@ -0,0 +1,186 @@
+import csv
+import gzip
+import json
+import time
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import select
+from werkzeug.datastructures import MultiDict
+from app.counters import STATUSES, ticket_counters
+from app.forms import TicketForm
+from app.models import db, Ticket, User, summarize
+from app.sla import sla
+
+
+def read_rows(path, format=None):
+    """Yield the records of a CSV or NDJSON file (optionally gzipped) one at a time.
+
+    The format is taken from the file name unless given. Column names match
+    the export, so an export can be imported as is.
+    """
+    name = path[:-3] if path.endswith('.gz') else path
+    format = format or ('csv' if name.endswith('.csv') else 'ndjson')
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', newline='', encoding='utf-8') as fh:
+        if format == 'csv':
+            yield from csv.DictReader(fh)
+        else:
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _parse_date(record, field, errors):
+    """``record[field]`` as a datetime, None if it is empty; a bad value is added to ``errors``."""
+    if not record.get(field):
+        return None
+    try:
+        return datetime.fromisoformat(record[field])
+    except (TypeError, ValueError):
+        errors[field] = ['not an ISO date']
+        return None
+
+
+class UserLookup:
+    """Username to ``(id, role)``, querying each name once; unknown names are remembered too."""
+
+    def __init__(self):
+        self._users = {}
+        self.queries = 0
+
+    def get(self, username):
+        if username not in self._users:
+            self.queries += 1
+            row = db.session.execute(select(User.id, User.role).where(User.username == username)).first()
+            self._users[username] = tuple(row) if row else None
+        return self._users[username]
+
+
+import_checkpoint = db.Table(
+    'import_checkpoint',
+    db.Column('source', db.String(255), primary_key=True),
+    db.Column('position', db.Integer, nullable=False),
+    db.Column('imported', db.Integer, nullable=False),
+    db.Column('rejected', db.Integer, nullable=False),
+)
+
+
+class Checkpoint:
+    """How far into ``source`` an import has committed, kept in the ``import_checkpoint`` table.
+
+    ``save`` only adds its write to the session's transaction, so the position
+    commits together with the batch it describes. Without a source nothing is
+    kept.
+    """
+
+    def __init__(self, source):
+        self.source = source
+
+    def load(self):
+        row = None
+        if self.source:
+            row = db.session.execute(
+                select(import_checkpoint.c.position, import_checkpoint.c.imported, import_checkpoint.c.rejected)
+                .where(import_checkpoint.c.source == self.source)).first()
+        return dict(row._mapping) if row else {'position': 0, 'imported': 0, 'rejected': 0}
+
+    def save(self, state):
+        if self.source:
+            values = {name: state[name] for name in ('position', 'imported', 'rejected')}
+            saved = db.session.execute(import_checkpoint.update()
+                                       .where(import_checkpoint.c.source == self.source).values(values)).rowcount
+            if not saved:
+                db.session.execute(import_checkpoint.insert().values(dict(values, source=self.source)))
+
+    def clear(self):
+        if self.source:
+            db.session.execute(import_checkpoint.delete().where(import_checkpoint.c.source == self.source))
+            db.session.commit()
+
+
+class TicketImporter:
+    """Validate ticket records and insert them in batches of ``batch_size``.
+
+    Each record is checked with the ``TicketForm`` rules (one form instance is
+    re-used) plus status, dates and the client/assignee usernames. Valid rows
+    of a batch are inserted with a single executemany, in one transaction with
+    the batch's counter deltas and checkpoint. Rejected records are counted and
+    passed to ``on_reject`` with their errors.
+    """
+
+    def __init__(self, batch_size=5000, checkpoint=None, on_reject=None, on_progress=None):
+        self.batch_size = batch_size
+        self.checkpoint = Checkpoint(checkpoint)
+        self.on_reject = on_reject
+        self.on_progress = on_progress
+        self.users = UserLookup()
+        self.form = TicketForm(meta={'csrf': False})
+
+    def validate(self, record):
+        """Return ``(row, None)`` for a valid record or ``(None, errors)``."""
+        self.form.process(MultiDict({key: record.get(key) or '' for key in ('title', 'description', 'priority')}))
+        errors = {} if self.form.validate() else dict(self.form.errors)
+        status = record.get('status') or 'open'
+        if status not in STATUSES:
+            errors['status'] = ['must be one of %s' % ', '.join(STATUSES)]
+        client = self.users.get(record.get('client') or '')
+        if client is None:
+            errors['client'] = ['unknown username']
+        assigned_to = None
+        if record.get('assigned_to'):
+            support = self.users.get(record['assigned_to'])
+            if support is None or support[1] != 'support':
+                errors['assigned_to'] = ['not a support user']
+            else:
+                assigned_to = support[0]
+        created_at = _parse_date(record, 'created_at', errors) or datetime.utcnow()
+        updated_at = _parse_date(record, 'updated_at', errors) or created_at
+        if errors:
+            return None, errors
+        description = self.form.description.data
+        return {'title': self.form.title.data, 'description': description, 'summary': summarize(description),
+                'priority': self.form.priority.data, 'status': status, 'user_id': client[0],
+                'assigned_to': assigned_to, 'created_at': created_at, 'updated_at': updated_at,
+                'due_at': sla.due_at(self.form.priority.data, created_at), 'sla_breached': False}, None
+
+    def run(self, records):
+        """Import ``records``, resuming after the last committed batch; returns the final totals."""
+        state = self.checkpoint.load()
+        resumed_at = position = state['position']
+        started = time.perf_counter()
+        batch = []
+        for position, record in enumerate(records, 1):
+            if position <= resumed_at:
+                continue
+            row, errors = self.validate(record)
+            if row is None:
+                state['rejected'] += 1
+                if self.on_reject is not None:
+                    self.on_reject(position, record, errors)
+            else:
+                batch.append(row)
+            if len(batch) >= self.batch_size:
+                self._commit(batch, state, position)
+                batch = []
+                self._progress(state, position - resumed_at, started)
+        if position > state['position']:
+            self._commit(batch, state, position)
+        self._progress(state, position - resumed_at, started)
+        self.checkpoint.clear()
+        return state
+
+    def _commit(self, batch, state, position):
+        if batch:
+            db.session.execute(Ticket.__table__.insert(), batch)
+            deltas = Counter((row['status'], row['priority'], row['assigned_to'] or 0) for row in batch)
+            ticket_counters.record(db.session, deltas)
+        # the new position commits with the batch, so a crash can't import the batch twice
+        self.checkpoint.save(dict(state, imported=state['imported'] + len(batch), position=position))
+        db.session.commit()
+        state['imported'] += len(batch)
+        state['position'] = position
+
+    def _progress(self, state, processed, started):
+        if self.on_progress is not None:
+            elapsed = time.perf_counter() - started
+            self.on_progress(state, processed / elapsed if elapsed else 0.0)
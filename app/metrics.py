@@ -0,0 +1,164 @@
+import hmac
+import os
+import threading
+import time
+from flask import Blueprint, Response, abort, request
+from app.cache import support_agents, user_cache
+from app.counters import ticket_counters
+from app.database import pool_stats
+from app.models import db
+
+metrics = Blueprint('metrics', __name__)
+
+STARTED_KEY = 'supportportal.metrics.started'
+
+# request latency buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class TicketCountCollector:
+    """Ticket counts by status, read from the ``ticket_counter`` table when scraped."""
+
+    def collect(self):
+        from prometheus_client.core import GaugeMetricFamily
+        family = GaugeMetricFamily('supportportal_tickets', 'Tickets by status.', labels=['status'])
+        for status, count in sorted(ticket_counters.summary().status.items()):
+            family.add_metric([status], count)
+        yield family
+
+
+class RequestMetrics:
+    """Prometheus metrics for request latency, in-flight requests, the DB pool and the caches.
+
+    With ``PROMETHEUS_MULTIPROC_DIR`` set (gunicorn.conf.py does) every worker
+    writes its samples to memory-mapped files in that directory and a scrape
+    of any worker merges all of them. Each such write takes a lock, so a
+    request makes just one: its latency observation, labelled with endpoint,
+    method and status (the histogram's ``_count`` doubles as the request
+    counter). In-flight requests, pool and cache gauges are counted in
+    process and written at most every ``gauge_interval`` seconds. Cache lookups
+    are counters: each refresh adds what the caches counted since the last one,
+    so the totals keep growing when a worker is recycled.
+    """
+
+    def __init__(self, gauge_interval=5):
+        self.enabled = False
+        self.gauge_interval = gauge_interval
+        self.token = None
+        self.registry = None
+        self._children = {}
+        self._in_flight = 0
+        self._cache_counts = {}
+        self._lock = threading.Lock()
+        self._gauges_at = 0.0
+
+    def init_app(self, app):
+        self.enabled = app.config['METRICS_ENABLED']
+        self.gauge_interval = app.config['METRICS_GAUGE_INTERVAL']
+        self.token = app.config['METRICS_TOKEN']
+        if not self.enabled:
+            return
+        try:
+            import prometheus_client
+        except ImportError as exc:
+            raise RuntimeError('METRICS_ENABLED requires the prometheus_client package') from exc
+        if self.registry is None:
+            self._create_metrics(prometheus_client)
+        app.wsgi_app = self._wrap_wsgi_app(app.wsgi_app)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._request_failed)
+        app.register_blueprint(metrics)
+
+    def _create_metrics(self, prometheus_client):
+        # a private registry, so building several apps in one process doesn't register twice
+        self.registry = prometheus_client.CollectorRegistry()
+        self.latency = prometheus_client.Histogram(
+            'supportportal_request_duration_seconds', 'Request latency by endpoint and status code.',
+            ['endpoint', 'method', 'status'], buckets=LATENCY_BUCKETS, registry=self.registry)
+        self.in_flight = prometheus_client.Gauge(
+            'supportportal_requests_in_flight', 'Requests being handled.',
+            registry=self.registry, multiprocess_mode='livesum')
+        self.pool = prometheus_client.Gauge(
+            'supportportal_db_pool_connections', 'Database pool connections by state.',
+            ['state'], registry=self.registry, multiprocess_mode='livesum')
+        self.cache = prometheus_client.Counter(
+            'supportportal_cache_lookups', 'Cache lookups by cache and result.',
+            ['cache', 'result'], registry=self.registry)
+
+    def _wrap_wsgi_app(self, wsgi_app):
+        # the start time goes in the WSGI environ before Flask pushes a request context,
+        # which saves a trip through the request proxy per request
+        def timed_wsgi_app(environ, start_response):
+            environ[STARTED_KEY] = time.perf_counter()
+            with self._lock:
+                self._in_flight += 1
+            return wsgi_app(environ, start_response)
+        return timed_wsgi_app
+
+    def _finish_request(self, response):
+        self._observe(request._get_current_object(), response.status_code)
+        return response
+
+    def _request_failed(self, error=None):
+        # in case the after_request hooks never got to run, e.g. one of them raised
+        req = request._get_current_object()
+        if STARTED_KEY in req.environ:
+            self._observe(req, 500)
+
+    def _observe(self, req, status):
+        # one trip through the request proxy, which costs about as much as the observation
+        elapsed = time.perf_counter() - req.environ.pop(STARTED_KEY)
+        with self._lock:
+            self._in_flight -= 1
+        key = (req.endpoint or '<unmatched>', req.method, status)
+        child = self._children.get(key)
+        if child is None:
+            # label lookups take a lock; do them once per endpoint/method/status
+            child = self._children[key] = self.latency.labels(key[0], key[1], str(status))
+        child.observe(elapsed)
+        if time.monotonic() >= self._gauges_at:
+            self._gauges_at = time.monotonic() + self.gauge_interval
+            self.refresh_gauges()
+
+    def refresh_gauges(self):
+        self.in_flight.set(self._in_flight)
+        stats = pool_stats(db.engine)
+        if stats:
+            self.pool.labels('checked_out').set(stats['checked_out'])
+            self.pool.labels('idle').set(stats['checked_in'])
+            self.pool.labels('overflow').set(stats['overflow'])
+            self.pool.labels('size').set(stats['size'])
+        with self._lock:
+            for name, cache in (('user', user_cache), ('support_agents', support_agents)):
+                cache_stats = cache.stats()
+                for result, count in (('hit', cache_stats['hits']), ('miss', cache_stats['misses'])):
+                    last = self._cache_counts.get((name, result), 0)
+                    # a cache that reset its counts has counted ``count`` since
+                    self.cache.labels(name, result).inc(count - last if count >= last else count)
+                    self._cache_counts[name, result] = count
+
+    def exposition(self):
+        """The text exposition of every worker's metrics (or this process's) plus ticket counts."""
+        from prometheus_client import CollectorRegistry, generate_latest
+        self.refresh_gauges()
+        registry = CollectorRegistry()
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            from prometheus_client.multiprocess import MultiProcessCollector
+            MultiProcessCollector(registry)
+        else:
+            registry.register(self.registry)
+        registry.register(TicketCountCollector())
+        return generate_latest(registry)
+
+
+request_metrics = RequestMetrics()
+
+
+@metrics.route('/metrics')
+def scrape():
+    token = request_metrics.token
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), 'Bearer ' + token):
+        abort(403)
+    from prometheus_client import CONTENT_TYPE_LATEST
+    return Response(request_metrics.exposition(), content_type=CONTENT_TYPE_LATEST,
+                    headers={'Cache-Control': 'no-store'})
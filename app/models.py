@@ -1,7 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin, LoginManager
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import case, event, func, select
+from sqlalchemy.orm import validates
 from datetime import datetime
+from app.passwords import passwords
 
 # Initialize extensions
 db = SQLAlchemy()
@@ -9,7 +11,8 @@ login_manager = LoginManager()
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    from app.cache import user_cache
+    return user_cache.load(int(user_id))
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -18,22 +21,127 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(128), nullable=False)
     role = db.Column(db.String(20), nullable=False, default='client')  # client or support
 
-    tickets = db.relationship('Ticket', backref='client', lazy=True)
-    assigned_tickets = db.relationship('Ticket', backref='support', lazy=True, foreign_keys='Ticket.assigned_to')
+    tickets = db.relationship('Ticket', back_populates='client', lazy=True, foreign_keys='Ticket.user_id')
+    assigned_tickets = db.relationship('Ticket', back_populates='support', lazy=True, foreign_keys='Ticket.assigned_to')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        """Verify ``password``; a match on a hash with outdated parameters re-hashes it."""
+        if not passwords.verify(self.password_hash, password):
+            return False
+        if passwords.needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
+
+SUMMARY_LENGTH = 150
+
+def summarize(description):
+    """Card-sized preview of a ticket description, as shown on list pages."""
+    if len(description) > SUMMARY_LENGTH:
+        return description[:SUMMARY_LENGTH] + '...'
+    return description
+
+def backfill_summary(table):
+    """UPDATE that fills ``summary`` for rows written before the column existed."""
+    description = table.c.description
+    preview = func.substr(description, 1, SUMMARY_LENGTH, type_=db.Text) + '...'
+    values = {column.name: column for column in table.c if column.onupdate is not None}  # keep updated_at as is
+    values['summary'] = case((func.length(description) > SUMMARY_LENGTH, preview), else_=description)
+    return table.update().values(values)
+
+def default_last_activity(context):
+    """Column default: a new ticket's last activity is its creation."""
+    return context.get_current_parameters()['created_at']
+
+def backfill_comment_count(table):
+    """UPDATE that fills ``comment_count`` for rows written before the column existed."""
+    comments = table.metadata.tables['comment'].c
+    values = {column.name: column for column in table.c if column.onupdate is not None}
+    values['comment_count'] = select(func.count()).where(comments.ticket_id == table.c.id).scalar_subquery()
+    return table.update().values(values)
+
+def backfill_last_activity(table):
+    """UPDATE that fills ``last_activity_at`` (newest comment, else creation) for rows written before the column existed."""
+    comments = table.metadata.tables['comment'].c
+    newest = select(func.max(comments.created_at)).where(comments.ticket_id == table.c.id).scalar_subquery()
+    values = {column.name: column for column in table.c if column.onupdate is not None}
+    values['last_activity_at'] = func.coalesce(newest, table.c.created_at)
+    return table.update().values(values)
+
+def track_comment_counts(comment_model, ticket_model):
+    """Keep the ticket's ``comment_count`` and ``last_activity_at`` current as comments are added and deleted.
+
+    The counter is bumped in SQL, in the same transaction as the comment, so
+    concurrent replies from several workers don't lose updates.
+    """
+    table = ticket_model.__table__
+    keep = {column.name: column for column in table.c if column.onupdate is not None}  # a reply is not an edit
+
+    def count(connection, ticket_id, delta, activity=None):
+        values = dict(keep, comment_count=table.c.comment_count + delta)
+        if activity is not None:
+            values['last_activity_at'] = activity
+        connection.execute(table.update().where(table.c.id == ticket_id).values(values))
+
+    event.listen(comment_model, 'after_insert',
+                 lambda mapper, connection, comment: count(connection, comment.ticket_id, 1, comment.created_at))
+    event.listen(comment_model, 'after_delete',
+                 lambda mapper, connection, comment: count(connection, comment.ticket_id, -1))
 
 class Ticket(db.Model):
+    __table_args__ = (
+        db.Index('ix_ticket_created', 'created_at'),
+        db.Index('ix_ticket_user_created', 'user_id', 'created_at'),
+        db.Index('ix_ticket_status_priority_created', 'status', 'priority', 'created_at'),
+        db.Index('ix_ticket_assigned_status', 'assigned_to', 'status'),
+        db.Index('ix_ticket_status_due', 'status', 'due_at'),
+        db.Index('ix_ticket_status_breached_due', 'status', 'sla_breached', 'due_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=False)
+    summary = db.Column(db.String(SUMMARY_LENGTH + 3), info={'backfill': backfill_summary})
     status = db.Column(db.String(20), nullable=False, default='open')  # open, in_progress, closed
     priority = db.Column(db.String(20), nullable=False, default='medium')  # low, medium, high
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     assigned_to = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    due_at = db.Column(db.DateTime)  # resolution deadline from the priority's SLA, see app/sla.py
+    sla_breached = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    # kept current by track_comment_counts, so list pages never count comments
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0',
+                              info={'backfill': backfill_comment_count})
+    last_activity_at = db.Column(db.DateTime, default=default_last_activity, info={'backfill': backfill_last_activity})
+
+    client = db.relationship('User', back_populates='tickets', foreign_keys=[user_id])
+    support = db.relationship('User', back_populates='assigned_tickets', foreign_keys=[assigned_to])
+
+    @validates('description')
+    def _update_summary(self, key, description):
+        self.summary = summarize(description)
+        return description
+
+class Comment(db.Model):
+    """A reply on a ticket's conversation thread.
+
+    There is deliberately no ``Ticket.comments`` collection: a busy ticket has
+    thousands of replies, so they are always read a page at a time.
+    """
+    __table_args__ = (
+        db.Index('ix_comment_ticket_created', 'ticket_id', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    ticket_id = db.Column(db.Integer, db.ForeignKey('ticket.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    ticket = db.relationship('Ticket')
+    author = db.relationship('User')
+
+track_comment_counts(Comment, Ticket)
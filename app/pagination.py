@@ -0,0 +1,73 @@
+import base64
+import binascii
+from datetime import datetime
+from sqlalchemy import tuple_
+
+
+class KeysetPage:
+    """One page of rows plus the cursors needed to reach its neighbours."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(created_at, id):
+    raw = '%s|%d' % (created_at.isoformat(), id)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Turn a cursor back into ``(created_at, id)``; raises ``ValueError`` if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, _, id = raw.partition('|')
+        return datetime.fromisoformat(created_at), int(id)
+    except (binascii.Error, UnicodeDecodeError) as exc:
+        raise ValueError('invalid cursor') from exc
+
+
+def keyset_paginate(query, created_col, id_col, per_page, after=None, before=None):
+    """Return a newest-first page of ``query`` keyed on ``(created_col, id_col)``.
+
+    ``after`` continues towards older rows and ``before`` goes back towards newer
+    ones. Both are cursors from a previous page, so each page is a bounded index
+    range instead of an OFFSET that has to skip every preceding row. Empty
+    cursors count as no cursor.
+    """
+    after, before = after or None, before or None
+    # a row-value comparison, unlike the equivalent OR, becomes an index range in SQLite
+    if before:
+        created_at, id = decode_cursor(before)
+        query = query.filter(tuple_(created_col, id_col) > tuple_(created_at, id))
+        query = query.order_by(created_col.asc(), id_col.asc())
+    else:
+        if after:
+            created_at, id = decode_cursor(after)
+            query = query.filter(tuple_(created_col, id_col) < tuple_(created_at, id))
+        query = query.order_by(created_col.desc(), id_col.desc())
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, after is not None
+
+    def cursor_for(row):
+        return encode_cursor(getattr(row, created_col.key), getattr(row, id_col.key))
+
+    return KeysetPage(rows,
+                      next_cursor=cursor_for(rows[-1]) if rows and has_next else None,
+                      prev_cursor=cursor_for(rows[0]) if rows and has_prev else None)
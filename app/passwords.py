@@ -0,0 +1,113 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    """Raised instead of queueing when the hasher already has its limit of jobs."""
+
+
+class PasswordHasher:
+    """Runs password hashing and verification on a small process pool.
+
+    The KDFs are deliberately slow, so running them in request threads lets a
+    burst of logins take the CPU from every other request on the worker. Here
+    at most ``queue_size`` jobs are in flight per web worker, running on
+    ``workers`` processes; beyond that ``HasherBusy`` is raised at once so the
+    caller can answer 503 rather than pile up requests. With ``workers=0``
+    jobs run in the calling thread, still bounded by ``queue_size``.
+
+    The pool is started on first use, i.e. inside each gunicorn worker rather
+    than in the preloading master. It only pays off on threaded workers: a sync
+    worker serves one request at a time, so the bound never fills and the
+    request waits for the hash anyway. Pool processes come from a forkserver
+    where available, since forking a worker that already runs threads (the SLA
+    sweeper, request threads) can copy a lock some thread holds.
+    """
+
+    def __init__(self, method='pbkdf2:sha256:600000', workers=1, queue_size=8, timeout=10):
+        self.configure(method, workers, queue_size, timeout)
+        self.rejected = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.configure(app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_HASH_WORKERS'],
+                       app.config['PASSWORD_HASH_QUEUE'], app.config['PASSWORD_HASH_TIMEOUT'])
+
+    def configure(self, method, workers, queue_size, timeout):
+        self.method = method
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._prefix = None
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True when ``pwhash`` was made with other parameters than ``method``."""
+        if self._prefix is None:
+            # the stored prefix spells out defaults a bare method name leaves implicit
+            self._prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._prefix
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HasherBusy()
+        if not self.workers:
+            try:
+                return function(*args)
+            finally:
+                self._slots.release()
+        future = None
+        try:
+            executor = self._pool()
+            future = executor.submit(function, *args)
+            return future.result(self.timeout)
+        except TimeoutError:
+            self.rejected += 1
+            raise HasherBusy() from None
+        except BrokenProcessPool:
+            # a pool process died (e.g. OOM-killed) and the pool refuses all further jobs
+            self._discard(executor)
+            raise
+        finally:
+            if future is not None and not future.done():
+                # the slot is held until the job finishes, even if this caller stops waiting
+                future.add_done_callback(lambda future: self._slots.release())
+            else:
+                self._slots.release()
+
+    def _pool(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(self.workers, mp_context=_mp_context())
+        return self._executor
+
+    def _discard(self, executor):
+        """Drop a broken pool so the next job starts a fresh one."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def stats(self):
+        return {'workers': self.workers, 'queue_size': self.queue_size, 'rejected': self.rejected}
+
+
+def _mp_context():
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return None  # the platform default, spawn on Windows and macOS
+
+
+passwords = PasswordHasher()
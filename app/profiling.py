@@ -0,0 +1,166 @@
+import heapq
+import threading
+import time
+from collections import deque
+from flask import before_render_template, current_app, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from app.models import db
+
+# how many of a request's statements are kept for the slow request log
+SLOWEST_STATEMENTS = 3
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class RequestProfile:
+    """What one request spent, filled in by the hooks of ``RequestProfiler``."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.slowest = []  # min-heap of (duration, statement), at most SLOWEST_STATEMENTS long
+        self._template_started = []
+
+    def start_template(self):
+        self._template_started.append(time.perf_counter())
+
+    def finish_template(self):
+        if self._template_started:
+            self.template_time += time.perf_counter() - self._template_started.pop()
+
+    def add_statement(self, duration, statement):
+        self.sql_count += 1
+        self.sql_time += duration
+        entry = (duration, statement)
+        if len(self.slowest) < SLOWEST_STATEMENTS:
+            heapq.heappush(self.slowest, entry)
+        elif entry > self.slowest[0]:
+            heapq.heapreplace(self.slowest, entry)
+
+
+class EndpointStats:
+    """Totals and the last ``window`` wall times of one endpoint."""
+
+    def __init__(self, window):
+        self.count = 0
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.times = deque(maxlen=window)
+
+    def add(self, wall, profile):
+        self.count += 1
+        self.sql_count += profile.sql_count
+        self.sql_time += profile.sql_time
+        self.template_time += profile.template_time
+        self.times.append(wall)
+
+    def summary(self):
+        ordered = sorted(self.times)
+        return {'count': self.count,
+                'p50_ms': _percentile(ordered, 0.50) * 1000,
+                'p95_ms': _percentile(ordered, 0.95) * 1000,
+                'p99_ms': _percentile(ordered, 0.99) * 1000,
+                'sql_statements_mean': self.sql_count / self.count,
+                'sql_ms_mean': self.sql_time / self.count * 1000,
+                'template_ms_mean': self.template_time / self.count * 1000}
+
+
+class RequestProfiler:
+    """Opt-in per-endpoint timing: wall time, template rendering, SQL statements and SQL time.
+
+    Engine events time each statement and Flask's template signals time each
+    render; both are added to a profile kept on ``g`` for the current request.
+    When the request ends its numbers go to its endpoint's totals and rolling
+    window of wall times, it gets a ``Server-Timing`` header, and if it took
+    longer than ``slow_ms`` it is logged with its slowest statements. Work done
+    outside a request (CLI commands, streamed response bodies) is not counted.
+    Numbers are per worker process.
+    """
+
+    def __init__(self, slow_ms=500, window=1000):
+        self.enabled = False
+        self.slow_ms = slow_ms
+        self.window = window
+        self.endpoints = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config['PROFILE_REQUESTS']
+        self.slow_ms = app.config['PROFILE_SLOW_MS']
+        self.window = app.config['PROFILE_WINDOW']
+        if not self.enabled:
+            return
+        app.before_request(self._start_request)
+        app.after_request(self._add_header)
+        app.teardown_request(self._finish_request)
+        before_render_template.connect(self._start_template, app)
+        template_rendered.connect(self._finish_template, app)
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._start_statement)
+            event.listen(db.engine, 'after_cursor_execute', self._finish_statement)
+
+    def _profile(self):
+        return g.get('_request_profile') if has_request_context() else None
+
+    def _start_request(self):
+        g._request_profile = RequestProfile()
+
+    def _start_statement(self, connection, cursor, statement, parameters, context, executemany):
+        if self._profile() is not None:
+            connection.info.setdefault('_statement_started', []).append(time.perf_counter())
+
+    def _finish_statement(self, connection, cursor, statement, parameters, context, executemany):
+        profile = self._profile()
+        started = connection.info.get('_statement_started')
+        if profile is not None and started:
+            profile.add_statement(time.perf_counter() - started.pop(), statement)
+
+    def _start_template(self, app, template, context):
+        profile = self._profile()
+        if profile is not None:
+            profile.start_template()
+
+    def _finish_template(self, app, template, context):
+        profile = self._profile()
+        if profile is not None:
+            profile.finish_template()
+
+    def _add_header(self, response):
+        profile = self._profile()
+        if profile is not None:
+            response.headers['Server-Timing'] = 'app;dur=%.1f, db;dur=%.1f;desc="%d queries", tpl;dur=%.1f' % (
+                (time.perf_counter() - profile.started) * 1000, profile.sql_time * 1000, profile.sql_count,
+                profile.template_time * 1000)
+        return response
+
+    def _finish_request(self, error=None):
+        profile = g.pop('_request_profile', None)
+        if profile is None:
+            return
+        wall = time.perf_counter() - profile.started
+        endpoint = request.endpoint or '<unmatched>'
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats(self.window)
+            stats.add(wall, profile)
+        if wall * 1000 >= self.slow_ms:
+            slowest = ''.join('\n  %.1f ms  %s' % (duration * 1000, ' '.join(statement.split()))
+                              for duration, statement in sorted(profile.slowest, reverse=True))
+            current_app.logger.warning('slow request %s %s (%s): %.1f ms, %d SQL statements in %.1f ms, '
+                                       'templates %.1f ms%s', request.method, request.path, endpoint, wall * 1000,
+                                       profile.sql_count, profile.sql_time * 1000, profile.template_time * 1000,
+                                       slowest)
+
+    def stats(self):
+        """Per-endpoint request count, rolling p50/p95/p99 wall time and mean SQL and template cost."""
+        with self._lock:
+            return {endpoint: stats.summary() for endpoint, stats in sorted(self.endpoints.items())}
+
+
+profiler = RequestProfiler()
@@ -0,0 +1,25 @@
+from sqlalchemy.orm import defer, joinedload
+from app.models import Comment, Ticket, User
+
+
+def ticket_list_query():
+    """Base query for ticket list pages.
+
+    Client and assignee are joined into the same SELECT so rendering a page of
+    N tickets costs one statement instead of one per row and relationship. Only
+    the usernames are read from the joined users, and the description is
+    deferred since list pages never render it.
+    """
+    return ticket_query().options(defer(Ticket.description))
+
+
+def ticket_query():
+    """Tickets with their client's and assignee's usernames loaded in the same SELECT."""
+    return Ticket.query.options(joinedload(Ticket.client).load_only(User.username),
+                                joinedload(Ticket.support).load_only(User.username))
+
+
+def comment_query(ticket_id):
+    """A ticket's comments with their authors' usernames loaded in the same SELECT."""
+    return Comment.query.filter(Comment.ticket_id == ticket_id).options(
+        joinedload(Comment.author).load_only(User.username))
@@ -0,0 +1,164 @@
+import functools
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import request
+from werkzeug.exceptions import TooManyRequests
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+def parse_limit(limit):
+    """Turn ``'5/minute'`` into a bucket of ``(rate per second, capacity)``; None stays None."""
+    if not limit:
+        return None
+    count, _, period = limit.partition('/')
+    count = int(count)
+    return count / PERIODS[period.strip()], count
+
+
+class MemoryStore:
+    """Token buckets for one process, kept in dicts so each take is O(1).
+
+    Buckets sharing a limit live in one ``OrderedDict`` ordered by last use, so
+    the periodic sweep only has to look at the oldest entries: a bucket idle for
+    ``capacity / rate`` seconds has refilled completely and can be forgotten.
+    """
+
+    def __init__(self, sweep_interval=60):
+        self.sweep_interval = sweep_interval
+        self._tables = {}
+        self._next_sweep = time.monotonic() + sweep_interval
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, capacity):
+        """Take a token from ``key``'s bucket; returns 0 or the seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            table = self._tables.setdefault((rate, capacity), OrderedDict())
+            tokens, updated = table.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            table[key] = (tokens, now)
+        return wait
+
+    def _sweep(self, now):
+        for (rate, capacity), table in self._tables.items():
+            while table:
+                key, (tokens, updated) = next(iter(table.items()))
+                if now - updated < capacity / rate:
+                    break
+                del table[key]
+        self._next_sweep = now + self.sweep_interval
+
+    def __len__(self):
+        return sum(len(table) for table in self._tables.values())
+
+
+# Refill and take in one step on the server, so workers can't race each other.
+# The server clock is used so workers' clocks needn't agree; the key expires once
+# the bucket would be full again.
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(wait)
+"""
+
+
+class SharedStore:
+    """Token buckets shared by all workers through a Redis-style client with ``eval``."""
+
+    def __init__(self, client, prefix='supportportal:ratelimit:'):
+        self.client = client
+        self.prefix = prefix
+
+    def take(self, key, rate, capacity):
+        return float(self.client.eval(TAKE_SCRIPT, 1, self.prefix + key, rate, capacity))
+
+
+def make_store(config):
+    kind = config['RATELIMIT_STORAGE']
+    if kind == 'memory':
+        return MemoryStore()
+    if kind == 'redis':
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError('RATELIMIT_STORAGE=redis requires the redis package') from exc
+        return SharedStore(redis.Redis.from_url(config['RATELIMIT_STORAGE_URL']))
+    raise ValueError('unknown RATELIMIT_STORAGE %r' % kind)
+
+
+class RateLimiter:
+    """Per-IP and per-username token buckets in front of the login and register views.
+
+    Only POSTs are counted, i.e. actual attempts. A request over either limit is
+    answered with 429 and ``Retry-After`` before the view, and with it the
+    password check, runs.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or MemoryStore()
+        self.enabled = True
+        self.limits = {'login': (parse_limit('20/minute'), parse_limit('5/minute')),
+                       'register': (parse_limit('10/hour'), None)}
+        self.rejected = 0
+
+    def init_app(self, app):
+        self.store = make_store(app.config)
+        self.enabled = app.config['RATELIMIT_ENABLED']
+        self.limits = {'login': (parse_limit(app.config['RATELIMIT_LOGIN_PER_IP']),
+                                 parse_limit(app.config['RATELIMIT_LOGIN_PER_USERNAME'])),
+                       'register': (parse_limit(app.config['RATELIMIT_REGISTER_PER_IP']), None)}
+        self.rejected = 0
+
+    def limit(self, scope):
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapped(*args, **kwargs):
+                if self.enabled and request.method == 'POST':
+                    self.check(scope)
+                return view(*args, **kwargs)
+            return wrapped
+        return decorator
+
+    def check(self, scope):
+        per_ip, per_username = self.limits[scope]
+        buckets = []
+        if per_ip:
+            buckets.append(('%s:ip:%s' % (scope, request.remote_addr), per_ip))
+        username = request.form.get('username', '').strip().lower()
+        if per_username and username:
+            buckets.append(('%s:user:%s' % (scope, username), per_username))
+        wait = max([self.store.take(key, rate, capacity) for key, (rate, capacity) in buckets] or [0])
+        if wait:
+            self.rejected += 1
+            raise TooManyRequests('Too many attempts, please try again in a moment.',
+                                  retry_after=math.ceil(wait))
+
+    def stats(self):
+        return {'rejected': self.rejected}
+
+
+limiter = RateLimiter()
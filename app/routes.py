@@ -1,12 +1,26 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from datetime import datetime
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
-from app.models import db, Ticket, User
-from app.forms import TicketForm, UpdateTicketForm
+from app.models import db, Comment, Ticket
+from app.assignment import assigner
+from app.cache import support_agents
+from app.counters import PRIORITIES, STATUSES, ticket_counters
+from app.events import can_stream, publish_ticket, ticket_events
+from app.export import FORMATS, export_tickets, parse_date
+from app.forms import CommentForm, TicketForm, UpdateTicketForm
+from app.pagination import keyset_paginate
+from app.queries import comment_query, ticket_list_query
+from app.search import search_tickets
+from app.sla import sla
 
 main = Blueprint('main', __name__)
 
 @main.route('/')
 def index():
+    if current_user.is_authenticated and current_user.role == 'support':
+        return render_template('index.html', counts=ticket_counters.summary(), statuses=STATUSES,
+                               priorities=PRIORITIES, agents=dict(support_agents.choices()),
+                               next_up=sla.next_up(5, ticket_list_query()), now=datetime.utcnow())
     return render_template('index.html')
 
 @main.route('/submit', methods=['GET', 'POST'])
@@ -16,8 +30,10 @@ def submit_ticket():
     if form.validate_on_submit():
         ticket = Ticket(title=form.title.data, description=form.description.data,
                         priority=form.priority.data, user_id=current_user.id)
+        assigner.assign(ticket)
         db.session.add(ticket)
         db.session.commit()
+        publish_ticket('created', ticket)
         flash('Ticket submitted successfully!')
         return redirect(url_for('main.my_tickets'))
     return render_template('submit_ticket.html', form=form)
@@ -25,8 +41,8 @@ def submit_ticket():
 @main.route('/my_tickets')
 @login_required
 def my_tickets():
-    tickets = Ticket.query.filter_by(user_id=current_user.id).all()
-    return render_template('my_tickets.html', tickets=tickets)
+    page = _ticket_page(ticket_list_query().filter(Ticket.user_id == current_user.id))
+    return render_template('my_tickets.html', tickets=page.items, page=page)
 
 @main.route('/all_tickets')
 @login_required
@@ -34,8 +50,37 @@ def all_tickets():
     if current_user.role != 'support':
         flash('Access denied')
         return redirect(url_for('main.index'))
-    tickets = Ticket.query.all()
-    return render_template('all_tickets.html', tickets=tickets)
+    page = _ticket_page(ticket_list_query())
+    return render_template('all_tickets.html', tickets=page.items, page=page, live=can_stream(request.environ))
+
+@main.route('/all_tickets/events')
+@login_required
+def all_tickets_events():
+    """Server-Sent Events stream of ticket changes that keeps the All Tickets page current."""
+    if current_user.role != 'support':
+        abort(403)
+    if not can_stream(request.environ):
+        abort(503)
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    subscription = ticket_events.subscribe(last_event_id)
+    if subscription is None:
+        # the page works without the live feed; the browser stops retrying on a 503
+        abort(503)
+    response = Response(ticket_events.stream(subscription), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # stop nginx from buffering the stream
+    return response
+
+def _ticket_page(query):
+    return _page(query, Ticket, current_app.config['TICKETS_PER_PAGE'])
+
+def _page(query, model, per_page):
+    try:
+        return keyset_paginate(query, model.created_at, model.id, per_page=per_page,
+                               after=request.args.get('after'),
+                               before=request.args.get('before'))
+    except ValueError:
+        abort(400)
 
 @main.route('/ticket/<int:id>', methods=['GET', 'POST'])
 @login_required
@@ -45,11 +90,73 @@ def ticket_detail(id):
         flash('Access denied')
         return redirect(url_for('main.index'))
     form = UpdateTicketForm()
-    form.assigned_to.choices = [(u.id, u.username) for u in User.query.filter_by(role='support').all()]
+    form.assigned_to.choices = support_agents.choices()
     if form.validate_on_submit() and current_user.role == 'support':
         ticket.status = form.status.data
         ticket.assigned_to = form.assigned_to.data
         db.session.commit()
+        publish_ticket('updated', ticket)
         flash('Ticket updated!')
         return redirect(url_for('main.ticket_detail', id=id))
-    return render_template('ticket_detail.html', ticket=ticket, form=form)
+    # newest replies first, from the (ticket_id, created_at) index; the template shows them oldest first
+    comments = _page(comment_query(ticket.id), Comment, current_app.config['COMMENTS_PER_PAGE'])
+    return render_template('ticket_detail.html', ticket=ticket, form=form, comments=comments,
+                           comment_form=CommentForm())
+
+@main.route('/ticket/<int:id>/comments', methods=['POST'])
+@login_required
+def add_comment(id):
+    ticket = Ticket.query.get_or_404(id)
+    if current_user.role != 'support' and ticket.user_id != current_user.id:
+        flash('Access denied')
+        return redirect(url_for('main.index'))
+    form = CommentForm()
+    if form.validate_on_submit():
+        db.session.add(Comment(ticket_id=ticket.id, user_id=current_user.id, body=form.body.data))
+        db.session.commit()
+        publish_ticket('updated', ticket)
+        flash('Reply posted.')
+    else:
+        for error in form.body.errors:
+            flash('Reply: %s' % error)
+    return redirect(url_for('main.ticket_detail', id=id))
+
+@main.route('/search')
+@login_required
+def search():
+    terms = request.args.get('q', '').strip()
+    status = request.args.get('status') or None
+    priority = request.args.get('priority') or None
+    page_number = request.args.get('page', 1, type=int)
+    if page_number < 1:
+        abort(400)
+    # clients only ever search their own tickets
+    owner = None if current_user.role == 'support' else current_user.id
+    results = search_tickets(terms, status=status, priority=priority, user_id=owner,
+                             page=page_number, per_page=current_app.config['TICKETS_PER_PAGE'],
+                             rank_window=current_app.config['SEARCH_RANK_WINDOW'])
+    return render_template('search.html', terms=terms, status=status, priority=priority, results=results)
+
+@main.route('/export')
+@login_required
+def export():
+    if current_user.role != 'support':
+        flash('Access denied')
+        return redirect(url_for('main.index'))
+    format = request.args.get('format', 'csv')
+    if format not in FORMATS:
+        abort(400)
+    try:
+        since = parse_date(request.args.get('since'))
+        until = parse_date(request.args.get('until'))
+    except ValueError:
+        abort(400)
+    compress = request.accept_encodings['gzip'] > 0
+    chunks = export_tickets(format, request.args.get('status') or None, since, until, compress)
+    response = Response(stream_with_context(chunks), mimetype=FORMATS[format])
+    response.headers['Content-Disposition'] = 'attachment; filename=tickets-%s.%s' % (
+        datetime.utcnow().strftime('%Y%m%d'), format)
+    response.vary.add('Accept-Encoding')
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
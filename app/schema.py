@@ -0,0 +1,126 @@
+from contextlib import contextmanager
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateColumn
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# key for the PostgreSQL advisory lock and name of the MySQL named lock
+SCHEMA_LOCK_KEY = 7264391
+SCHEMA_LOCK_NAME = 'supportportal_schema'
+
+
+@contextmanager
+def schema_lock(engine):
+    """Hold an exclusive lock, across processes, while the schema is checked and changed.
+
+    Workers started together (``GUNICORN_PRELOAD=0``, or several instances) would
+    otherwise all see the same missing table or column and race to create it.
+    Everything run under the lock has to inspect the database itself, since
+    another process may have upgraded it while this one waited. SQLite files get
+    an ``flock`` on ``<database>.lock`` (the upgrade spans several transactions,
+    so a database lock would block itself); PostgreSQL and MySQL use an advisory
+    lock. In-memory SQLite needs no lock.
+    """
+    dialect = engine.dialect.name
+    if dialect == 'sqlite':
+        database = engine.url.database
+        if not database or database == ':memory:' or fcntl is None:
+            yield
+            return
+        with open(database + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    elif dialect in ('postgresql', 'mysql'):
+        if dialect == 'postgresql':
+            lock = text('SELECT pg_advisory_lock(%d)' % SCHEMA_LOCK_KEY)
+            unlock = text('SELECT pg_advisory_unlock(%d)' % SCHEMA_LOCK_KEY)
+        else:
+            lock = text("SELECT GET_LOCK('%s', -1)" % SCHEMA_LOCK_NAME)
+            unlock = text("SELECT RELEASE_LOCK('%s')" % SCHEMA_LOCK_NAME)
+        # the lock belongs to this session, which stays open until the upgrade is done
+        with engine.connect() as conn:
+            conn.execute(lock)
+            conn.commit()
+            try:
+                yield
+            finally:
+                conn.execute(unlock)
+                conn.commit()
+    else:
+        yield
+
+
+def ensure_columns(engine, tables):
+    """Add declared columns that are missing from existing tables.
+
+    Only columns that can be added in place (nullable, or with a server default)
+    are supported. A column may carry ``info={'backfill': fn}``, where ``fn(table)``
+    returns the UPDATE that populates it for existing rows. Returns
+    ``table.column`` names that were added.
+    """
+    preparer = engine.dialect.identifier_preparer
+    added = []
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                conn.execute(text('ALTER TABLE %s ADD COLUMN %s' % (preparer.format_table(table), ddl)))
+                backfill = column.info.get('backfill')
+                if backfill is not None:
+                    conn.execute(backfill(table))
+                added.append('%s.%s' % (table.name, column.name))
+    return added
+
+
+def ensure_indexes(engine, tables):
+    """Create declared indexes that are missing from existing tables.
+
+    ``create_all`` only emits indexes together with a new table, so databases
+    created before an index was declared never get it. This is safe to run on
+    every start, also from several workers at once: existing indexes are left
+    alone. Returns the names created.
+    """
+    created = []
+    inspector = inspect(engine)
+    for table in tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name in existing:
+                continue
+            # each index in its own transaction, so losing a race only rolls back that one
+            try:
+                with engine.begin() as conn:
+                    index.create(conn)
+            except DBAPIError:
+                # another worker starting at the same time may have created it first
+                if index.name not in {found['name'] for found in inspect(engine).get_indexes(table.name)}:
+                    raise
+                continue
+            created.append(index.name)
+    if created and engine.dialect.name == 'sqlite':
+        with engine.begin() as conn:
+            # refresh planner statistics so the new indexes are actually chosen
+            conn.execute(text('ANALYZE'))
+    return created
+
+
+def upgrade_schema(engine, metadata):
+    """Add missing columns, then missing indexes. Returns a description of each change."""
+    columns = ensure_columns(engine, metadata.sorted_tables)
+    indexes = ensure_indexes(engine, metadata.sorted_tables)
+    return ['added column %s' % name for name in columns] + ['created index %s' % name for name in indexes]
@@ -0,0 +1,174 @@
+from markupsafe import Markup, escape
+from sqlalchemy import inspect, or_, text
+from app.models import db, Ticket
+
+# External-content FTS5 index over ticket.title/description. The triggers keep it
+# in step with every write to ticket, whichever code path issues it; the UPDATE
+# trigger only fires when title or description change, not on status updates.
+SEARCH_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS ticket_fts USING fts5(
+        title, description, content='ticket', content_rowid='id', tokenize='porter unicode61', prefix='3 4')""",
+    # rank matches in the title ten times higher than in the description
+    "INSERT INTO ticket_fts(ticket_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)')",
+    """CREATE TRIGGER IF NOT EXISTS ticket_fts_ai AFTER INSERT ON ticket BEGIN
+        INSERT INTO ticket_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS ticket_fts_ad AFTER DELETE ON ticket BEGIN
+        INSERT INTO ticket_fts(ticket_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS ticket_fts_au AFTER UPDATE OF title, description ON ticket BEGIN
+        INSERT INTO ticket_fts(ticket_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO ticket_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+]
+
+SEARCH_QUERY = """
+    SELECT ticket.id, ticket.title, ticket.status, ticket.priority, ticket.created_at,
+           snippet(ticket_fts, -1, char(2), char(3), '...', 16) AS snippet
+    FROM ticket_fts CROSS JOIN ticket ON ticket.id = ticket_fts.rowid
+    WHERE ticket_fts MATCH :query {window} {filters}
+    ORDER BY ticket_fts.rank, ticket.id
+    LIMIT :limit OFFSET :offset
+"""
+
+# CROSS JOIN keeps ticket_fts the outer loop: with ticket outside, every ticket
+# row would open its own FTS cursor and bm25 would re-read each term's doclist
+# per row. Ordering by rank and id (rather than rank alone) also stops FTS5 from
+# scoring every match up front, so only rows that pass the filters get a score.
+
+# bm25 has to score every match before the best ones are known, so a term found in
+# most tickets costs time proportional to the table. With a rank window only the
+# newest N matches are scored; walking the doclist by rowid to find them is cheap.
+# The window counts matches that pass the filters too, or a filtered search would
+# lose every match older than the newest N overall.
+RANK_WINDOW = """AND ticket_fts.rowid >= COALESCE((
+        SELECT ticket_fts.rowid FROM ticket_fts {join}
+        WHERE ticket_fts MATCH :query {filters}
+        ORDER BY ticket_fts.rowid DESC LIMIT 1 OFFSET :window), 0)"""
+
+# A filter on a client or a status picks out its tickets from ix_ticket_user_created
+# or ix_ticket_status_priority_created. When that is at most CANDIDATE_LIMIT tickets
+# the doclist walk tests each match against the candidate list instead of looking
+# up its ticket row, which is what made a client's search walk every match of a
+# common term. Broader filters keep the row lookups: most matches pass them, so
+# the walk stops early.
+CANDIDATE_LIMIT = 50000
+
+CANDIDATES = 'AND +ticket_fts.rowid IN (SELECT ticket.id FROM ticket WHERE {conditions})'
+
+COUNT_CANDIDATES = 'SELECT count(*) FROM (SELECT 1 FROM ticket WHERE {conditions} LIMIT :candidate_limit)'
+
+
+class SearchPage:
+    def __init__(self, items, page, has_next):
+        self.items = items
+        self.page = page
+        self.has_next = has_next
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+
+def uses_fts(engine):
+    return engine.dialect.name == 'sqlite'
+
+
+def ensure_search_index(engine):
+    """Create the FTS5 table and triggers if missing, indexing existing tickets.
+
+    Returns True when the index was created. A no-op on other databases, where
+    search falls back to LIKE matching.
+    """
+    if not uses_fts(engine) or inspect(engine).has_table('ticket_fts'):
+        return False
+    with engine.begin() as conn:
+        for statement in SEARCH_SCHEMA:
+            conn.execute(text(statement))
+    rebuild_search_index(engine)
+    return True
+
+
+def rebuild_search_index(engine):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO ticket_fts(ticket_fts) VALUES ('rebuild')"))
+
+
+def to_match_query(terms):
+    """Quote each word so user input can't inject FTS5 syntax; a trailing * keeps prefix search."""
+    phrases = []
+    for word in terms.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*').replace('"', '""')
+        if word:
+            phrases.append('"%s"%s' % (word, '*' if prefix else ''))
+    return ' '.join(phrases)
+
+
+def _highlight(snippet):
+    return Markup(str(escape(snippet)).replace('\x02', '<mark>').replace('\x03', '</mark>'))
+
+
+def search_tickets(terms, status=None, priority=None, user_id=None, page=1, per_page=20, rank_window=0):
+    """Rank tickets matching ``terms`` by bm25, optionally filtered, one page at a time.
+
+    With ``rank_window`` set, only the newest ``rank_window`` matches that pass the
+    filters are ranked, which bounds the cost of very common terms.
+    """
+    query = to_match_query(terms)
+    if not query:
+        return SearchPage([], page, False)
+    params = {'query': query, 'limit': per_page + 1, 'offset': (page - 1) * per_page,
+              'window': rank_window - 1}
+    conditions = []
+    for column, value in (('status', status), ('priority', priority), ('user_id', user_id)):
+        if value:
+            conditions.append('ticket.%s = :%s' % (column, column))
+            params[column] = value
+
+    if uses_fts(db.engine):
+        if _few_candidates(params):
+            filters = CANDIDATES.format(conditions=' AND '.join(conditions))
+            join = ''
+        else:
+            filters = ' '.join('AND ' + condition for condition in conditions)
+            join = 'CROSS JOIN ticket ON ticket.id = ticket_fts.rowid' if filters else ''
+        window = RANK_WINDOW.format(join=join, filters=filters) if rank_window else ''
+        sql = SEARCH_QUERY.format(window=window, filters=filters)
+        statement = text(sql).columns(created_at=db.DateTime)
+        rows = [dict(row._mapping, snippet=_highlight(row.snippet))
+                for row in db.session.execute(statement, params)]
+    else:
+        rows = _search_like(terms, params, status, priority, user_id)
+    return SearchPage(rows[:per_page], page, len(rows) > per_page)
+
+
+def _few_candidates(params):
+    """Whether an index narrows the filters in ``params`` to at most ``CANDIDATE_LIMIT`` tickets."""
+    if 'user_id' in params:
+        columns = ['user_id']
+    elif 'status' in params:
+        # status and priority are the leading columns of one index
+        columns = [column for column in ('status', 'priority') if column in params]
+    else:
+        return False  # priority alone leads no index; counting it would scan the table
+    conditions = ' AND '.join('ticket.%s = :%s' % (column, column) for column in columns)
+    count = db.session.execute(text(COUNT_CANDIDATES.format(conditions=conditions)),
+                               dict(params, candidate_limit=CANDIDATE_LIMIT + 1)).scalar()
+    return count <= CANDIDATE_LIMIT
+
+
+def _search_like(terms, params, status, priority, user_id):
+    query = db.session.query(Ticket.id, Ticket.title, Ticket.status, Ticket.priority,
+                             Ticket.created_at, Ticket.summary)
+    for word in terms.split():
+        pattern = '%' + word.strip('*') + '%'
+        query = query.filter(or_(Ticket.title.ilike(pattern), Ticket.description.ilike(pattern)))
+    for column, value in ((Ticket.status, status), (Ticket.priority, priority), (Ticket.user_id, user_id)):
+        if value:
+            query = query.filter(column == value)
+    query = query.order_by(Ticket.created_at.desc(), Ticket.id.desc())
+    return [dict(row._mapping, snippet=row.summary)
+            for row in query.limit(params['limit']).offset(params['offset'])]
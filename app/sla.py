@@ -0,0 +1,177 @@
+import heapq
+import itertools
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, event, inspect, or_, select
+from sqlalchemy.exc import IntegrityError
+from app.models import db, Ticket
+
+# tickets in these states are still being worked on and can breach their SLA
+ACTIVE_STATUSES = ('open', 'in_progress')
+
+SWEEP_LEASE = 'sla-sweep'
+
+
+class SLATracker:
+    """Resolution deadlines per priority, stored on each ticket as ``due_at``.
+
+    ``due_at`` is set when a ticket is inserted and moved when its priority
+    changes, so the "next up" queue is an index range scan on
+    ``(status, due_at)`` per active status instead of a sort over every open
+    ticket. ``sweep()`` sets ``sla_breached`` on overdue tickets in batches (and
+    fills ``due_at`` on tickets written before the column existed); it runs
+    from ``flask sla-sweep`` and, every ``sweep_interval`` seconds, from a
+    background thread started by each worker's first request. Only the thread
+    holding the ``sla-sweep`` row in ``job_lease`` sweeps, so one process does
+    the work however many workers and hosts there are; when it stops renewing
+    the lease another takes over.
+    """
+
+    def __init__(self, db, model, policies=None, warning=3600, sweep_interval=60, batch_size=500):
+        self.db = db
+        self.model = model
+        self.policies = policies or {'high': 4, 'medium': 24, 'low': 72}
+        self.warning = warning
+        self.sweep_interval = sweep_interval
+        self.batch_size = batch_size
+        self.sweeps = 0
+        self.flagged = 0
+        self._sweeper_pid = None
+        self._lock = threading.Lock()
+        self.lease = db.Table(
+            'job_lease',
+            db.Column('name', db.String(50), primary_key=True),
+            db.Column('holder', db.String(100), nullable=False),
+            db.Column('expires_at', db.DateTime, nullable=False),
+        )
+        event.listen(model, 'before_insert', self._before_insert)
+        event.listen(model, 'before_update', self._before_update)
+
+    def init_app(self, app):
+        self.policies = app.config['SLA_POLICIES']
+        self.warning = app.config['SLA_WARNING_MINUTES'] * 60
+        self.sweep_interval = app.config['SLA_SWEEP_INTERVAL']
+        self.batch_size = app.config['SLA_SWEEP_BATCH']
+        if self.sweep_interval:
+            app.before_request(lambda: self.start_sweeper(app))
+
+    def due_at(self, priority, created_at=None):
+        """When a ticket of ``priority`` opened at ``created_at`` must be resolved; unknown priorities get the longest SLA."""
+        hours = self.policies.get(priority, max(self.policies.values()))
+        return (created_at or datetime.utcnow()) + timedelta(hours=hours)
+
+    def _default_priority(self):
+        default = self.model.__table__.c.priority.default
+        return default.arg if default is not None and default.is_scalar else None
+
+    def _before_insert(self, mapper, connection, ticket):
+        if ticket.due_at is None:
+            if ticket.created_at is None:
+                ticket.created_at = datetime.utcnow()  # so both come from the same clock reading
+            ticket.due_at = self.due_at(ticket.priority or self._default_priority(), ticket.created_at)
+
+    def _before_update(self, mapper, connection, ticket):
+        if inspect(ticket).attrs.priority.history.has_changes():
+            ticket.due_at = self.due_at(ticket.priority, ticket.created_at)
+            ticket.sla_breached = ticket.due_at <= datetime.utcnow()
+
+    def next_up(self, limit=10, query=None, now=None):
+        """The ``limit`` active tickets that are overdue or due within ``warning`` seconds, soonest first.
+
+        Each active status is read in ``due_at`` order from the index and the
+        sorted runs are merged, so no more than ``limit`` rows per status are
+        fetched whatever the size of the backlog.
+        """
+        query = query if query is not None else self.model.query
+        horizon = (now or datetime.utcnow()) + timedelta(seconds=self.warning)
+        runs = [query.filter(self.model.status == status, self.model.due_at <= horizon)
+                .order_by(self.model.due_at, self.model.id).limit(limit).all()
+                for status in ACTIVE_STATUSES]
+        return list(itertools.islice(heapq.merge(*runs, key=lambda ticket: (ticket.due_at, ticket.id)), limit))
+
+    def sweep(self, now=None, batch_size=None):
+        """Fill missing due dates and flag overdue active tickets, committing every batch.
+
+        Returns ``(filled, flagged)``.
+        """
+        now = now or datetime.utcnow()
+        batch_size = batch_size or self.batch_size
+        table = self.model.__table__
+        # leave updated_at alone: being flagged is not an edit
+        keep = {column.name: column for column in table.c if column.onupdate is not None}
+        filled = flagged = 0
+        while True:
+            rows = self.db.session.execute(
+                select(table.c.id, table.c.priority, table.c.created_at)
+                .where(table.c.due_at.is_(None), table.c.status.in_(ACTIVE_STATUSES)).limit(batch_size)).all()
+            if not rows:
+                break
+            self.db.session.execute(
+                table.update().where(table.c.id == bindparam('ticket_id')).values(dict(keep, due_at=bindparam('due'))),
+                [{'ticket_id': id, 'due': self.due_at(priority, created_at)} for id, priority, created_at in rows])
+            self.db.session.commit()
+            filled += len(rows)
+        for status in ACTIVE_STATUSES:
+            while True:
+                ids = self.db.session.execute(
+                    select(table.c.id).where(table.c.status == status, table.c.due_at < now,
+                                             table.c.sla_breached.is_(False))
+                    .order_by(table.c.due_at).limit(batch_size)).scalars().all()
+                if not ids:
+                    break
+                self.db.session.execute(table.update().where(table.c.id.in_(ids)).values(dict(keep, sla_breached=True)))
+                self.db.session.commit()
+                flagged += len(ids)
+        with self._lock:
+            self.sweeps += 1
+            self.flagged += flagged
+        return filled, flagged
+
+    def take_lease(self, now=None, holder=None):
+        """Take or renew the sweep lease for ``3 * sweep_interval`` seconds; True when this process holds it."""
+        now = now or datetime.utcnow()
+        holder = holder or '%s:%d' % (socket.gethostname(), os.getpid())
+        lease = self.lease
+        values = {'holder': holder, 'expires_at': now + timedelta(seconds=3 * self.sweep_interval)}
+        try:
+            renewed = self.db.session.execute(
+                lease.update().where(lease.c.name == SWEEP_LEASE, or_(lease.c.holder == holder, lease.c.expires_at < now))
+                .values(values)).rowcount
+            if not renewed:
+                # held by another process, or never taken: only the insert can tell
+                self.db.session.execute(lease.insert().values(dict(values, name=SWEEP_LEASE)))
+            self.db.session.commit()
+        except IntegrityError:
+            self.db.session.rollback()
+            return False
+        return True
+
+    def start_sweeper(self, app):
+        """Start this process's sweep thread unless it is running; forked workers start their own."""
+        if self._sweeper_pid == os.getpid():
+            return
+        with self._lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+        threading.Thread(target=self._sweep_forever, args=(app,), name='sla-sweeper', daemon=True).start()
+
+    def _sweep_forever(self, app):
+        while True:
+            time.sleep(self.sweep_interval)
+            with app.app_context():
+                try:
+                    if self.take_lease():
+                        self.sweep()
+                except Exception:
+                    app.logger.exception('SLA sweep failed')
+                    self.db.session.rollback()
+
+    def stats(self):
+        return {'sweeps': self.sweeps, 'flagged': self.flagged}
+
+
+sla = SLATracker(db, Ticket)
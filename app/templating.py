@@ -0,0 +1,40 @@
+import hashlib
+from flask import render_template
+from jinja2 import ChoiceLoader, DictLoader
+
+
+class InlineTemplates:
+    """Serve template strings through the app's loader so each is compiled once.
+
+    ``render_template_string`` parses and compiles its source on every call.
+    Here a source is registered under a name derived from its content hash the
+    first time it is rendered, after which Jinja's template cache hands back the
+    already compiled template. Named sources (e.g. a base layout) can be
+    registered up front so inline templates can ``{% extends %}`` them.
+    """
+
+    def __init__(self, app=None):
+        self.sources = {}
+        self._names = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        loader = DictLoader(self.sources)
+        if app.jinja_loader is not None:
+            loader = ChoiceLoader([loader, app.jinja_loader])
+        app.jinja_loader = loader
+
+    def register(self, name, source):
+        self.sources[name] = source
+
+    def name_for(self, source):
+        name = self._names.get(source)
+        if name is None:
+            name = 'inline-%s.html' % hashlib.sha1(source.encode()).hexdigest()
+            self.sources[name] = source
+            self._names[source] = name
+        return name
+
+    def render(self, source, **context):
+        return render_template(self.name_for(source), **context)
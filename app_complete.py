@@ -21,6 +21,7 @@ class Config:
 def create_app():
     from flask import Flask, render_template, request, redirect, url_for, flash
     from flask_sqlalchemy import SQLAlchemy
+    from sqlalchemy.orm import joinedload
     from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
     from flask_wtf import FlaskForm
     from wtforms import StringField, PasswordField, TextAreaField, SelectField, SubmitField
@@ -138,7 +139,7 @@ def create_app():
     @login_required
     def dashboard():
         if current_user.role == 'support':
-            tickets = Ticket.query.all()
+            tickets = Ticket.query.options(joinedload(Ticket.user)).all()
             return render_template_string(SUPPORT_DASHBOARD_TEMPLATE, tickets=tickets)
         else:
             tickets = Ticket.query.filter_by(user_id=current_user.id).all()
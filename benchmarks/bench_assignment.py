@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Compare picking the least loaded support agent with per-agent counts and with the load heap.
+
+The count strategy runs one weighted COUNT per agent, as a straightforward
+implementation would. ``LeastLoadedAssigner.pick`` re-reads the loads from
+``ticket_counter`` (``rebuild``) and then takes the top of the heap (``heap``);
+with the default ``AUTO_ASSIGN_REBUILD_INTERVAL=0`` a pick costs both.
+All are timed over the same agents and open tickets.
+
+    python benchmarks/bench_assignment.py --agents 10,100,500 --tickets 50000
+"""
+import argparse
+import random
+import time
+
+from common import bench_app, emit, percentiles
+from sqlalchemy import func, select
+
+
+def count_pick(db, Ticket, agents, weights):
+    best = None
+    for agent in agents:
+        load = 0
+        for priority, count in db.session.execute(
+                select(Ticket.priority, func.count())
+                .where(Ticket.assigned_to == agent, Ticket.status.in_(('open', 'in_progress')))
+                .group_by(Ticket.priority)):
+            load += weights.get(priority, 1) * count
+        if best is None or (load, agent) < best:
+            best = (load, agent)
+    return best[1] if best else None
+
+
+def run(agents, tickets, picks):
+    from app.assignment import assigner
+    from app.cache import support_agents
+    from app.counters import ticket_counters
+    from app.models import db, User, Ticket
+
+    app = bench_app()
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [
+            {'username': 'user%d' % i, 'email': 'user%d@example.com' % i, 'password_hash': 'x',
+             'role': 'client' if i == 0 else 'support'} for i in range(agents + 1)])
+        ids = [id for id, in db.session.execute(select(User.id).where(User.role == 'support'))]
+        client_id = db.session.execute(select(User.id).where(User.role == 'client')).scalar()
+        db.session.execute(Ticket.__table__.insert(), [
+            {'title': 'Ticket %d' % i, 'description': 'x', 'summary': 'x', 'user_id': client_id,
+             'priority': random.choice(('low', 'medium', 'high')),
+             'status': random.choice(('open', 'in_progress', 'closed')),
+             'assigned_to': random.choice(ids)} for i in range(tickets)])
+        db.session.commit()
+        ticket_counters.reconcile()
+        support_agents.invalidate()  # the users went in with a bulk INSERT
+        assigner.rebuild()
+
+        samples = {'count_queries': [], 'rebuild': [], 'heap': []}
+        assigner.rebuild_interval = 3600  # rebuilds are timed on their own
+        for _ in range(picks):
+            started = time.perf_counter()
+            expected = count_pick(db, Ticket, ids, assigner.weights)
+            samples['count_queries'].append(time.perf_counter() - started)
+            started = time.perf_counter()
+            assigner.rebuild()
+            samples['rebuild'].append(time.perf_counter() - started)
+            started = time.perf_counter()
+            picked = assigner.pick()
+            samples['heap'].append(time.perf_counter() - started)
+            assert picked == expected, (picked, expected)
+            # the picked agent takes a ticket, as an assignment would
+            deltas = {('open', 'medium', picked): 1}
+            ticket_counters.apply(db.session.connection(), deltas)
+            assigner.apply(deltas)
+            db.session.execute(Ticket.__table__.insert().values(
+                title='New', description='x', summary='x', user_id=client_id, priority='medium', assigned_to=picked))
+        db.session.rollback()
+    return {name: percentiles(values) for name, values in samples.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--agents', default='10,100,500', help='comma-separated agent counts')
+    parser.add_argument('--tickets', type=int, default=50000)
+    parser.add_argument('--picks', type=int, default=50)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+    random.seed(0)
+    emit({agents: run(agents, args.tickets, args.picks)
+          for agents in map(int, args.agents.split(','))}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Show that the ticket export streams in constant memory.
+
+Grows one database through the given sizes and, at each size, drains
+``export_tickets`` (CSV, NDJSON and gzipped CSV) into a byte counter, reporting
+rows per second, output size and the peak of Python allocations while
+exporting. The peak should stay flat as the ticket count grows.
+
+    python benchmarks/bench_export.py --sizes 10000,100000,1000000
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from common import bench_app, emit
+
+
+def grow(app, start, stop, batch=10000):
+    from app.models import db, Ticket, User
+
+    with app.app_context():
+        if start == 0:
+            db.session.execute(User.__table__.insert(), [
+                {'username': 'user%d' % i, 'email': 'user%d@example.com' % i, 'password_hash': 'x',
+                 'role': 'support' if i % 10 == 0 else 'client'} for i in range(100)])
+        origin = datetime(2020, 1, 1)
+        for offset in range(start, stop, batch):
+            db.session.execute(Ticket.__table__.insert(), [
+                {'title': 'Ticket %d' % i, 'description': 'Printer on floor %d is out of toner again. ' % i * 4,
+                 'summary': 'Printer', 'status': ('open', 'in_progress', 'closed')[i % 3], 'priority': 'medium',
+                 'created_at': origin + timedelta(seconds=i), 'updated_at': origin + timedelta(seconds=i),
+                 'user_id': i % 100 + 1, 'assigned_to': (i % 10) * 10 + 1 if i % 2 else None}
+                for i in range(offset, min(stop, offset + batch))])
+            db.session.commit()
+
+
+def measure(app, format, compress, batch_size):
+    from app.export import export_tickets
+
+    with app.app_context():
+        tracemalloc.start()
+        started = time.perf_counter()
+        size = 0
+        for chunk in export_tickets(format, compress=compress, batch_size=batch_size):
+            size += len(chunk)
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {'seconds': elapsed, 'output_bytes': size, 'peak_alloc_kb': peak // 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='comma separated ticket counts')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    app = bench_app()
+    report = {}
+    seeded = 0
+    for size in [int(size) for size in args.sizes.split(',')]:
+        grow(app, seeded, size)
+        seeded = size
+        runs = {'csv': measure(app, 'csv', False, args.batch_size),
+                'ndjson': measure(app, 'ndjson', False, args.batch_size),
+                'csv.gz': measure(app, 'csv', True, args.batch_size)}
+        for run in runs.values():
+            run['rows_per_sec'] = size / run['seconds']
+        report[size] = runs
+    emit(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Latency and throughput of the main pages against a seeded database.
+
+Seeds users and tickets with ``seed.py`` (or uses an already seeded
+``--database``), then drives each route through the Flask test client:
+
+    all_tickets     GET /all_tickets as a support agent
+    my_tickets      GET /my_tickets as a client, picked with the seed's ticket skew
+    ticket_detail   GET /ticket/<id> of a random ticket as a support agent
+    login           POST /auth/login with a random user's password
+    submit_ticket   POST /submit as a client
+
+Reports requests per second and latency percentiles per route as JSON,
+together with the commit and data size, so runs on two commits can be
+compared. Logins run the real password hash, so they are few by default.
+Rate limiting is off. ``bench_wsgi.py`` covers concurrent HTTP load.
+
+    python benchmarks/bench_routes.py --users 1000 --tickets 1000000 --output before.json
+    python benchmarks/seed.py --database sqlite:////tmp/seeded.db
+    python benchmarks/bench_routes.py --database sqlite:////tmp/seeded.db --routes all_tickets,my_tickets
+"""
+import argparse
+import bisect
+import itertools
+import platform
+import random
+import sqlite3
+import subprocess
+import time
+
+from common import ROOT, bench_app, emit, percentiles
+from seed import PASSWORD, print_progress, seed
+
+ROUTES = ('all_tickets', 'my_tickets', 'ticket_detail', 'login', 'submit_ticket')
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def logged_in(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def scenarios(app, rng):
+    """``{route: (request function, expected status)}``; each function makes one request."""
+    from sqlalchemy import func, select
+    from app.models import db, Ticket, User
+
+    with app.app_context():
+        users = db.session.execute(select(User.id, User.username, User.role).order_by(User.id)).all()
+        last_ticket = db.session.execute(select(func.max(Ticket.id))).scalar()
+    agents = [logged_in(app, id) for id, username, role in users if role == 'support'][:10]
+    clients = [id for id, username, role in users if role == 'client']
+    # the same Zipf-like skew the seed gives ticket owners, over a pool of logged-in clients
+    pool = [logged_in(app, id) for id in clients[:50]]
+    weights = list(itertools.accumulate(1.0 / rank for rank in range(1, len(pool) + 1)))
+    usernames = [username for id, username, role in users]
+
+    def client():
+        return pool[bisect.bisect(weights, rng.random() * weights[-1])]
+
+    return {
+        'all_tickets': (lambda: rng.choice(agents).get('/all_tickets'), 200),
+        'my_tickets': (lambda: client().get('/my_tickets'), 200),
+        'ticket_detail': (lambda: rng.choice(agents).get('/ticket/%d' % rng.randint(1, last_ticket)), 200),
+        'login': (lambda: app.test_client().post('/auth/login', data={
+            'username': rng.choice(usernames), 'password': PASSWORD}), 302),
+        'submit_ticket': (lambda: client().post('/submit', data={
+            'title': 'VPN keeps disconnecting', 'priority': rng.choice(('low', 'medium', 'high')),
+            'description': 'It drops every few minutes since this morning. Restarting did not help.'}), 302),
+    }
+
+
+def measure(request, expected, count, warmup):
+    for _ in range(warmup):
+        request()
+    samples = []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(count):
+        t0 = time.perf_counter()
+        response = request()
+        samples.append(time.perf_counter() - t0)
+        if response.status_code != expected:
+            errors += 1
+    elapsed = time.perf_counter() - started
+    return dict(percentiles(samples), requests_per_sec=count / elapsed, errors=errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help='already seeded database URL to use instead of a fresh one')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--tickets', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the data and the requests')
+    parser.add_argument('--routes', default=','.join(ROUTES), help='comma separated subset of ' + ', '.join(ROUTES))
+    parser.add_argument('--requests', type=int, default=500, help='timed requests per route')
+    parser.add_argument('--login-requests', type=int, default=20, help='timed requests for login')
+    parser.add_argument('--warmup', type=int, default=20, help='untimed requests per route first')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    routes = args.routes.split(',')
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        parser.error('unknown routes: ' + ', '.join(sorted(unknown)))
+    app = bench_app(args.database, RATELIMIT_ENABLED=False)
+    report = {'commit': git_commit(), 'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+              'routes': {}}
+    if args.database:
+        report['database'] = args.database
+    else:
+        report['seed'] = seed(app, args.users, args.tickets, args.seed, progress=print_progress)
+    rng = random.Random(args.seed)
+    requests = scenarios(app, rng)
+    for route in routes:
+        request, expected = requests[route]
+        count = args.login_requests if route == 'login' else args.requests
+        report['routes'][route] = measure(request, expected, count, min(args.warmup, count))
+    emit(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Full-text search latency over a synthetic ticket corpus.
+
+Seeds tickets whose words follow a Zipf-like distribution (so there are both
+very common and rare terms), then times /search-style queries through
+``search_tickets``: single rare/common terms, multi-word queries, prefix
+queries, status/priority filters and a client's own tickets.
+
+    python benchmarks/bench_search.py --tickets 1000000
+    python benchmarks/bench_search.py --database sqlite:////tmp/seeded.db --tickets 0
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from common import bench_app, emit, percentiles
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'xe', 'zu', 'pri', 'net', 'log', 'dis', 'ser']
+
+
+def vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def seed(app, count, words, rng, batch=10000):
+    from app.models import db, Ticket, User, summarize
+
+    weights = [1.0 / (rank + 1) for rank in range(len(words))]
+    start = datetime(2020, 1, 1)
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [
+            {'username': 'client%d' % i, 'email': 'client%d@example.com' % i, 'password_hash': 'x', 'role': 'client'}
+            for i in range(100)])
+        for offset in range(0, count, batch):
+            rows = []
+            for i in range(offset, min(count, offset + batch)):
+                description = ' '.join(rng.choices(words, weights, k=rng.randint(30, 80)))
+                rows.append({
+                    'title': ' '.join(rng.choices(words, weights, k=rng.randint(3, 7))),
+                    'description': description, 'summary': summarize(description),
+                    'status': rng.choices(['open', 'in_progress', 'closed'], [2, 1, 7])[0],
+                    'priority': rng.choices(['low', 'medium', 'high'], [5, 4, 1])[0],
+                    'created_at': start + timedelta(minutes=i), 'updated_at': start + timedelta(minutes=i),
+                    'user_id': rng.randint(1, 100)})
+            db.session.execute(Ticket.__table__.insert(), rows)
+            db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tickets', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=200, help='queries per scenario')
+    parser.add_argument('--database', help='existing database URL to search instead of a fresh one')
+    parser.add_argument('--rank-window', type=int, default=5000, help='SEARCH_RANK_WINDOW; 0 ranks every match')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    from app.search import search_tickets as search
+
+    def search_tickets(terms, **filters):
+        return search(terms, rank_window=args.rank_window, **filters)
+
+    rng = random.Random(0)
+    app = bench_app(args.database)
+    words = vocabulary(5000, rng)
+    started = time.perf_counter()
+    if args.tickets:
+        seed(app, args.tickets, words, rng)
+    seeded = time.perf_counter() - started
+
+    common_words, rare_words = words[:50], words[-2000:]
+    scenarios = {
+        'common_term': lambda: search_tickets(rng.choice(common_words)),
+        'rare_term': lambda: search_tickets(rng.choice(rare_words)),
+        'two_terms': lambda: search_tickets('%s %s' % (rng.choice(common_words), rng.choice(words[:500]))),
+        'prefix': lambda: search_tickets(rng.choice(words[:500])[:4] + '*'),
+        'filtered': lambda: search_tickets(rng.choice(words[:500]), status='open', priority='high'),
+        'open_common_term': lambda: search_tickets(rng.choice(common_words), status='open'),
+        'owner_common_term': lambda: search_tickets(rng.choice(common_words), user_id=rng.randint(1, 100)),
+        'page_5': lambda: search_tickets(rng.choice(common_words), page=5),
+    }
+    report = {'tickets': args.tickets, 'rank_window': args.rank_window, 'seed_seconds': round(seeded, 1)}
+    with app.test_request_context():
+        for name, run in scenarios.items():
+            samples = []
+            for _ in range(args.queries):
+                t0 = time.perf_counter()
+                run()
+                samples.append(time.perf_counter() - t0)
+            report[name] = percentiles(samples)
+    emit(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Compare SQLite pragma profiles under concurrent mixed reads and writes.
+
+For each ``SQLITE_PROFILE`` several worker processes share one database file,
+as gunicorn workers would, and loop for a fixed time over the ticket list page
+(reads) and ticket submission (writes). Reports operations per second, latency
+percentiles per operation and how many requests failed, e.g. with "database is
+locked".
+
+    python benchmarks/bench_sqlite.py --processes 8 --write-ratio 0.2 --duration 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from common import bench_app, emit, percentiles
+
+
+def seed(database_url, profile, tickets):
+    from app.models import db, User, Ticket
+
+    app = bench_app(database_url, SQLITE_PROFILE=profile)
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [
+            {'username': 'user%d' % i, 'email': 'user%d@example.com' % i, 'password_hash': 'x',
+             'role': 'support' if i == 0 else 'client'} for i in range(50)])
+        db.session.execute(Ticket.__table__.insert(), [
+            {'title': 'Ticket %d' % i, 'description': 'Something is broken (%d)' % i,
+             'summary': 'Something is broken (%d)' % i, 'priority': 'medium', 'status': 'open',
+             'user_id': i % 50 + 1} for i in range(tickets)])
+        db.session.commit()
+
+
+def worker(args):
+    database_url, profile, write_ratio, duration, seed_value = args
+    rng = random.Random(seed_value)
+    app = bench_app(database_url, SQLITE_PROFILE=profile, AUTO_UPGRADE_SCHEMA=False)
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    web = app.test_client()
+    with web.session_transaction() as session:
+        session['_user_id'] = str(rng.randint(2, 50))
+    samples = {'read': [], 'write': []}
+    errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        write = rng.random() < write_ratio
+        started = time.perf_counter()
+        if write:
+            response = web.post('/submit', data={'title': 'Load test', 'priority': 'low',
+                                                 'description': 'Submitted under load'})
+            ok = response.status_code == 302
+        else:
+            response = web.get('/my_tickets')
+            ok = response.status_code == 200
+        samples['write' if write else 'read'].append(time.perf_counter() - started)
+        errors += not ok
+    return samples, errors
+
+
+def run(profile, processes, write_ratio, duration, tickets):
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='supportportal-bench-'), 'bench.db')
+    seed(database_url, profile, tickets)
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.map(worker, [(database_url, profile, write_ratio, duration, i) for i in range(processes)])
+    reads = [sample for samples, _ in results for sample in samples['read']]
+    writes = [sample for samples, _ in results for sample in samples['write']]
+    return {'ops_per_sec': (len(reads) + len(writes)) / duration,
+            'errors': sum(errors for _, errors in results),
+            'read': percentiles(reads), 'write': percentiles(writes)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profiles', default='none,wal', help='comma separated SQLITE_PROFILE values')
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per profile')
+    parser.add_argument('--tickets', type=int, default=2000)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+    emit({profile: run(profile, args.processes, args.write_ratio, args.duration, args.tickets)
+          for profile in args.profiles.split(',')}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Measure what the user identity cache saves on every authenticated request.
+
+Runs the Flask-Login user loader with each cache backend (none, in-process LRU,
+and the shared backend over a local stand-in for Redis) and reports latency and
+SQL statements per lookup, plus end-to-end timings of an authenticated page.
+
+    python benchmarks/bench_user_cache.py --users 1000 --lookups 20000
+"""
+import argparse
+import random
+import time
+
+from common import bench_app, emit, percentiles
+from sqlalchemy import event
+
+
+class LocalSharedClient:
+    """Stand-in for a Redis server: same get/setex/delete calls, values kept as bytes."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value.encode()
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def run(backend, users, lookups, requests):
+    from app.cache import SharedBackend, user_cache
+    from app.models import db, User, load_user
+
+    app = bench_app(USER_CACHE_BACKEND='none' if backend == 'shared' else backend)
+    if backend == 'shared':
+        user_cache.backend = SharedBackend(LocalSharedClient())
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [
+            {'username': 'user%d' % i, 'email': 'user%d@example.com' % i,
+             'password_hash': 'x', 'role': 'support' if i % 20 == 0 else 'client'}
+            for i in range(users)])
+        db.session.commit()
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(1))
+
+    ids = [random.randint(1, users) for _ in range(lookups)]
+    samples = []
+    for user_id in ids:
+        with app.test_request_context():
+            started = time.perf_counter()
+            load_user(str(user_id))
+            samples.append(time.perf_counter() - started)
+    loader = dict(percentiles(samples), statements_per_lookup=len(statements) / lookups)
+
+    web = app.test_client()
+    with web.session_transaction() as session:
+        session['_user_id'] = '1'
+    web.get('/my_tickets')
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        web.get('/my_tickets')
+        samples.append(time.perf_counter() - started)
+    return {'user_loader': loader, 'my_tickets': percentiles(samples), 'cache': user_cache.stats()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--lookups', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+    random.seed(0)
+    emit({backend: run(backend, args.users, args.lookups, args.requests)
+          for backend in ('none', 'lru', 'shared')}, args.output)
+
+
+if __name__ == '__main__':
+    main()
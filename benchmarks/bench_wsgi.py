@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Load test the gunicorn deployment and show throughput scaling with workers.
+
+Seeds a throwaway SQLite database, then for each worker count starts
+``gunicorn -c gunicorn.conf.py wsgi:app`` and drives an authenticated ticket
+list page from several client processes for a fixed time. Reports requests per
+second and latency percentiles per worker count.
+
+    python benchmarks/bench_wsgi.py --workers 1,2,4,8 --clients 16 --duration 10
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import ROOT, bench_app, emit, percentiles
+
+
+def seed(database_url, users, tickets):
+    from app.models import db, User, Ticket
+
+    app = bench_app(database_url)
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [
+            {'username': 'user%d' % i, 'email': 'user%d@example.com' % i, 'password_hash': 'x',
+             'role': 'support' if i % 10 == 0 else 'client'} for i in range(users)])
+        db.session.execute(Ticket.__table__.insert(), [
+            {'title': 'Ticket %d' % i, 'description': 'Something is broken (%d)' % i,
+             'summary': 'Something is broken (%d)' % i, 'priority': 'medium', 'status': 'open',
+             'user_id': i % users + 1} for i in range(tickets)])
+        db.session.commit()
+        # the session cookie of user 1, a support user, signed with the shared SECRET_KEY
+        return app.session_interface.get_signing_serializer(app).dumps({'_user_id': '1', '_fresh': True})
+
+
+def wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('gunicorn did not start listening on port %d' % port)
+
+
+def client(args):
+    port, path, cookie, duration = args
+    samples = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        try:
+            conn.request('GET', path, headers={'Cookie': 'session=' + cookie})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except OSError:
+            errors += 1
+        finally:
+            conn.close()
+        samples.append(time.perf_counter() - started)
+    return samples, errors
+
+
+def run(workers, threads, clients, duration, port, path, cookie, database_url):
+    env = dict(os.environ, DATABASE_URL=database_url, WEB_CONCURRENCY=str(workers),
+               WEB_THREADS=str(threads), BIND='127.0.0.1:%d' % port, AUTO_UPGRADE_SCHEMA='0')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+                              cwd=ROOT, env=env, stderr=subprocess.DEVNULL)
+    try:
+        wait_for(port)
+        client((port, path, cookie, 0.5))  # warm up
+        with multiprocessing.Pool(clients) as pool:
+            results = pool.map(client, [(port, path, cookie, duration)] * clients)
+    finally:
+        server.terminate()
+        server.wait()
+    samples = [sample for batch, _ in results for sample in batch]
+    return dict(percentiles(samples), requests_per_sec=len(samples) / duration,
+                errors=sum(errors for _, errors in results))
+
+
+def main():
+    cpus = multiprocessing.cpu_count()
+    default_workers = sorted({1, 2, cpus, 2 * cpus + 1})
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', default=','.join(map(str, default_workers)),
+                        help='comma separated worker counts to compare')
+    parser.add_argument('--threads', type=int, default=1, help='threads per worker')
+    parser.add_argument('--clients', type=int, default=2 * cpus, help='concurrent client processes')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per worker count')
+    parser.add_argument('--path', default='/all_tickets')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--tickets', type=int, default=5000)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='supportportal-bench-'), 'bench.db')
+    cookie = seed(database_url, args.users, args.tickets)
+    report = {'cpus': cpus, 'clients': args.clients, 'threads': args.threads, 'path': args.path, 'runs': {}}
+    for workers in [int(w) for w in args.workers.split(',')]:
+        report['runs'][workers] = run(workers, args.threads, args.clients, args.duration,
+                                      args.port, args.path, cookie, database_url)
+    emit(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
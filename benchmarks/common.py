@@ -0,0 +1,41 @@
+"""Shared helpers for the benchmark scripts in this directory."""
+import json
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import create_app  # noqa: E402
+from config import Config  # noqa: E402
+
+
+def bench_app(database_url=None, **overrides):
+    """Build the app against a throwaway SQLite file unless a database is given."""
+    if database_url is None:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='supportportal-bench-'), 'bench.db')
+    settings = dict(SQLALCHEMY_DATABASE_URI=database_url, WTF_CSRF_ENABLED=False)
+    settings.update(overrides)
+    return create_app(type('BenchConfig', (Config,), settings))
+
+
+def percentiles(samples):
+    """p50/p95/p99/mean of a list of durations in seconds, reported in milliseconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {'count': len(ordered), 'mean_ms': sum(ordered) / len(ordered) * 1000,
+            'p50_ms': pick(0.50), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99)}
+
+
+def emit(result, output=None):
+    text = json.dumps(result, indent=2, sort_keys=True, default=str)
+    if output:
+        with open(output, 'w') as fh:
+            fh.write(text + '\n')
+    print(text)
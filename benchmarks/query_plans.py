@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""Check the SQLite query plans of the hot routes against golden files.
+
+Seeds a small database with ``seed.py``, then drives each scenario below
+through the test client. Every SELECT, UPDATE and DELETE it sends is recorded
+and run through ``EXPLAIN QUERY PLAN``. Each scenario's plans are compared with
+``benchmarks/plans/<scenario>.txt``. A statement fails when its plan gains a
+table scan (``SCAN ticket``, or ``SCAN ticket USING INDEX ...`` where a SEARCH
+narrowed the index before) or a temporary B-tree (``USE TEMP B-TREE FOR ORDER
+BY``) that its golden plan does not have; statements without a golden plan
+fail on any of them. Other differences are printed but pass, since
+SQLite words the same plan differently between versions. After an intended
+change, ``--update`` rewrites the golden files; review their diff like code.
+
+    python benchmarks/query_plans.py
+    python benchmarks/query_plans.py --update
+"""
+import argparse
+import os
+import re
+import sys
+
+from common import bench_app
+from seed import PASSWORD, seed
+
+PLANS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plans')
+TEMP_BTREE = 'USE TEMP B-TREE'
+PLANNED = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+
+
+def normalize(statement):
+    statement = ' '.join(statement.split())
+    # expanding IN lists get one placeholder per value
+    return re.sub(r'IN \(\?(?:, \?)*\)', 'IN (?...)', statement)
+
+
+def degradations(plan, tables):
+    """The lines of ``plan`` that scan a table (bare or along an index) or sort in a temporary B-tree."""
+    marked = set()
+    for line in plan:
+        line = line.strip()
+        words = line.split()
+        # "SCAN ticket USING INDEX ..." walks a whole index, which only pays off with an early LIMIT
+        if (len(words) >= 2 and words[0] == 'SCAN' and words[1] in tables) or TEMP_BTREE in line:
+            marked.add(line)
+    return marked
+
+
+class PlanRecorder:
+    """Collects the distinct statements an app sends while ``recording`` is on."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.recording = False
+        self.statements = {}
+        event.listen(engine, 'before_cursor_execute', self._record)
+
+    def _record(self, connection, cursor, statement, parameters, context, executemany):
+        if self.recording and statement.lstrip().upper().startswith(PLANNED):
+            self.statements.setdefault(normalize(statement), (statement, parameters[0] if executemany else parameters))
+
+    def take(self):
+        statements, self.statements = self.statements, {}
+        return statements
+
+
+def explain(connection, statement, parameters):
+    depth = {0: -1}
+    plan = []
+    for id, parent, _, detail in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters):
+        depth[id] = depth.get(parent, -1) + 1
+        # SQLite before 3.36 says "SCAN TABLE ticket"
+        detail = detail.replace('SCAN TABLE ', 'SCAN ').replace('SEARCH TABLE ', 'SEARCH ')
+        plan.append('    ' + '  ' * depth[id] + detail)
+    return plan
+
+
+def read_golden(name):
+    """``{statement: plan lines}`` from a golden file, or None if there is none."""
+    path = os.path.join(PLANS, name + '.txt')
+    if not os.path.exists(path):
+        return None
+    plans = {}
+    with open(path) as fh:
+        for line in fh:
+            line = line.rstrip('\n')
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith(' '):
+                plans[statement].append(line)
+            else:
+                statement = line
+                plans[statement] = []
+    return plans
+
+
+def write_golden(name, description, plans):
+    with open(os.path.join(PLANS, name + '.txt'), 'w') as fh:
+        fh.write('# %s\n# generated by benchmarks/query_plans.py --update\n' % description)
+        for statement, plan in plans.items():
+            fh.write('\n%s\n%s\n' % (statement, '\n'.join(plan)))
+
+
+def scenarios(app):
+    """``[(name, description, run)]``; ``run`` makes the scenario's requests."""
+    from sqlalchemy import func, select
+    from app.models import db, Ticket, User
+    from app.pagination import encode_cursor
+
+    with app.app_context():
+        agent = db.session.execute(select(User.id).where(User.role == 'support').order_by(User.id)).scalar()
+        # the busiest client, as seeded
+        client, = db.session.execute(select(Ticket.user_id).group_by(Ticket.user_id)
+                                     .order_by(func.count().desc()).limit(1)).one()
+        username = db.session.get(User, client).username
+        middle = db.session.execute(select(Ticket).order_by(Ticket.id)
+                                    .offset(db.session.query(Ticket).count() // 2).limit(1)).scalar()
+        cursor, middle = encode_cursor(middle.created_at, middle.id), middle.id
+        own = db.session.execute(select(Ticket.id).where(Ticket.user_id == client).limit(1)).scalar()
+
+    def logged_in(user_id):
+        web = app.test_client()
+        with web.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return web
+
+    support, customer = logged_in(agent), logged_in(client)
+
+    def dashboard():
+        support.get('/')
+
+    def all_tickets():
+        support.get('/all_tickets')
+        support.get('/all_tickets?after=' + cursor)
+        support.get('/all_tickets?before=' + cursor)
+
+    def my_tickets():
+        customer.get('/my_tickets')
+        customer.get('/my_tickets?after=' + cursor)
+
+    def ticket_detail():
+        support.get('/ticket/%d' % middle)
+        support.get('/ticket/%d?after=%s' % (middle, cursor))
+        customer.get('/ticket/%d' % own)
+
+    def add_comment():
+        customer.post('/ticket/%d/comments' % own, data={'body': 'Still broken after the restart.'})
+
+    def ticket_update():
+        support.post('/ticket/%d' % middle, data={'status': 'in_progress', 'assigned_to': agent})
+
+    def submit_ticket():
+        customer.get('/submit')
+        customer.post('/submit', data={'title': 'Printer is not working', 'priority': 'high',
+                                       'description': 'It shows an error. Restarting did not help.'})
+
+    def search():
+        support.get('/search?q=printer')
+        support.get('/search?q=printer&status=open&priority=high&page=2')
+        customer.get('/search?q=vpn')
+
+    def export():
+        support.get('/export?format=csv&status=open&since=2024-12-01').get_data()
+
+    def login():
+        app.test_client().post('/auth/login', data={'username': username, 'password': PASSWORD})
+
+    def register():
+        app.test_client().post('/auth/register', data={
+            'username': 'newcomer', 'email': 'newcomer@example.com', 'password': PASSWORD,
+            'password2': PASSWORD, 'role': 'client'})
+
+    return [
+        ('dashboard', 'GET / as a support agent', dashboard),
+        ('all_tickets', 'GET /all_tickets, first page and both cursor directions', all_tickets),
+        ('my_tickets', 'GET /my_tickets as the busiest client, first and next page', my_tickets),
+        ('ticket_detail', 'GET /ticket/<id> as a support agent (also older replies) and as the owner', ticket_detail),
+        ('add_comment', 'POST /ticket/<id>/comments as the owner', add_comment),
+        ('ticket_update', 'POST /ticket/<id> changing status and assignee', ticket_update),
+        ('submit_ticket', 'GET and POST /submit as a client', submit_ticket),
+        ('search', 'GET /search, plain and filtered, as a support agent and as a client', search),
+        ('export', 'GET /export of open tickets since a date', export),
+        ('login', 'POST /auth/login with the right password', login),
+        ('register', 'POST /auth/register of a new client', register),
+    ]
+
+
+def check(name, plans, golden, tables):
+    """Failure and note messages for one scenario."""
+    failures, notes = [], []
+    for statement, plan in plans.items():
+        expected = (golden or {}).get(statement)
+        added = degradations(plan, tables) - degradations(expected or [], tables)
+        if added:
+            failures.append('%s: %s\n  %s\n  plan:\n%s%s' % (
+                name, ', '.join(sorted(added)), statement, '\n'.join(plan),
+                '\n  golden plan:\n' + '\n'.join(expected) if expected is not None else '\n  (no golden plan)'))
+        elif expected is None:
+            notes.append('%s: new statement %s' % (name, statement))
+        elif [line.strip() for line in plan] != [line.strip() for line in expected]:
+            notes.append('%s: plan changed for %s\n%s' % (name, statement, '\n'.join(plan)))
+    for statement in set(golden or {}) - set(plans):
+        notes.append('%s: no longer sent: %s' % (name, statement))
+    return failures, notes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--update', action='store_true', help='rewrite the golden files from this run')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--tickets', type=int, default=20000)
+    args = parser.parse_args()
+
+    from app.models import db
+
+    app = bench_app(RATELIMIT_ENABLED=False, SLA_SWEEP_INTERVAL=0)
+    if app.config['SQLALCHEMY_DATABASE_URI'].split(':')[0] != 'sqlite':
+        sys.exit('query plans are only checked on SQLite')
+    seed(app, args.users, args.tickets)
+    with app.app_context():
+        recorder = PlanRecorder(db.engine)
+    tables = set(db.metadata.tables)
+    failures, notes = [], []
+    for name, description, run in scenarios(app):
+        recorder.recording = True
+        try:
+            run()
+        finally:
+            recorder.recording = False
+        with app.app_context():
+            connection = db.session.connection()
+            plans = {key: explain(connection, statement, parameters)
+                     for key, (statement, parameters) in recorder.take().items()}
+            db.session.rollback()
+        if args.update:
+            write_golden(name, description, plans)
+        else:
+            scenario_failures, scenario_notes = check(name, plans, read_golden(name), tables)
+            failures += scenario_failures
+            notes += scenario_notes
+    if args.update:
+        print('wrote golden plans to ' + PLANS)
+        return
+    for note in notes:
+        print('note: ' + note)
+    for failure in failures:
+        print('FAIL: ' + failure)
+    if failures:
+        sys.exit('%d statements lost their index; fix the query or index, or run --update if intended'
+                 % len(failures))
+    print('query plans match the golden files')
+
+
+if __name__ == '__main__':
+    main()
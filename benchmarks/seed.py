@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Fill a database with synthetic users and tickets for benchmarks.
+
+Rows are generated from a fixed random seed and a fixed end date, so the same
+arguments always give the same data. About 5% of the users are support agents;
+ticket owners follow a Zipf-like curve (a few clients file most tickets);
+priorities lean towards low and medium; and old tickets are mostly closed
+while recent ones are mostly open or in progress. Tickets go in with bulk
+INSERTs of ``batch_size`` rows. Afterwards the dashboard counters are
+reconciled and SQLite gets fresh planner statistics. Every user's password is
+``PASSWORD``.
+
+    python benchmarks/seed.py --database sqlite:////tmp/seeded.db --users 1000 --tickets 1000000
+"""
+import argparse
+import bisect
+import itertools
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from common import bench_app, emit
+
+PASSWORD = 'benchmark'
+END = datetime(2025, 1, 1)
+SUPPORT_EVERY = 20  # user 1 and every 20th user after it are support agents
+
+PRIORITY_WEIGHTS = {'low': 45, 'medium': 40, 'high': 15}
+# tickets from the last RECENT_DAYS are still being worked on; older ones are mostly closed
+RECENT_DAYS = 14
+RECENT_STATUS_WEIGHTS = {'open': 50, 'in_progress': 30, 'closed': 20}
+OLD_STATUS_WEIGHTS = {'open': 2, 'in_progress': 1, 'closed': 97}
+
+SUBJECTS = ['Printer', 'VPN', 'Email', 'Laptop', 'Password reset', 'Invoice', 'Shared drive', 'Phone',
+            'Calendar', 'Badge reader', 'Monitor', 'Wi-Fi', 'Software licence', 'Account']
+PROBLEMS = ['is not working', 'keeps disconnecting', 'is very slow', 'shows an error', 'needs to be set up',
+            'was charged twice', 'cannot be accessed', 'stopped syncing']
+SENTENCES = ['It started this morning after the update.', 'Restarting did not help.',
+             'Colleagues on the same floor have the same problem.', 'The error message says access denied.',
+             'This is blocking the monthly report.', 'I have attached a screenshot of the settings.',
+             'It worked fine until last week.', 'Please call me on my desk phone if you need details.']
+
+
+def _weights(choices):
+    return list(choices), list(itertools.accumulate(choices.values()))
+
+
+def seed_users(db, User, count, password_hash):
+    db.session.execute(User.__table__.insert(), [
+        {'username': 'user%d' % i, 'email': 'user%d@example.com' % i, 'password_hash': password_hash,
+         'role': 'support' if i % SUPPORT_EVERY == 1 else 'client'} for i in range(1, count + 1)])
+    db.session.commit()
+
+
+def ticket_rows(start, stop, total, clients, agents, rng, days, sla):
+    """Rows ``start`` to ``stop`` of ``total`` tickets, oldest first, spread over ``days`` days before END."""
+    from app.models import summarize
+
+    priorities, priority_weights = _weights(PRIORITY_WEIGHTS)
+    recent_statuses, recent_weights = _weights(RECENT_STATUS_WEIGHTS)
+    old_statuses, old_weights = _weights(OLD_STATUS_WEIGHTS)
+    client_weights = list(itertools.accumulate(1.0 / rank for rank in range(1, len(clients) + 1)))
+    span = timedelta(days=days).total_seconds()
+    recent = END - timedelta(days=RECENT_DAYS)
+    rows = []
+    for i in range(start, stop):
+        created_at = END - timedelta(seconds=span * (total - i) / total)
+        if created_at >= recent:
+            status = rng.choices(recent_statuses, cum_weights=recent_weights)[0]
+        else:
+            status = rng.choices(old_statuses, cum_weights=old_weights)[0]
+        priority = rng.choices(priorities, cum_weights=priority_weights)[0]
+        description = ' '.join(rng.choices(SENTENCES, k=rng.randint(1, 12)))
+        due_at = sla.due_at(priority, created_at)
+        rows.append({
+            'title': '%s %s' % (rng.choice(SUBJECTS), rng.choice(PROBLEMS)),
+            'description': description, 'summary': summarize(description),
+            'status': status, 'priority': priority,
+            'created_at': created_at,
+            'updated_at': created_at + timedelta(hours=rng.randint(0, 72)) if status != 'open' else created_at,
+            'user_id': clients[bisect.bisect(client_weights, rng.random() * client_weights[-1])],
+            'assigned_to': rng.choice(agents) if status != 'open' or rng.random() < 0.5 else None,
+            'due_at': due_at, 'sla_breached': status != 'closed' and due_at < END})
+    return rows
+
+
+def seed(app, users=1000, tickets=1000000, random_seed=0, days=730, batch_size=10000, progress=None):
+    """Insert ``users`` users and ``tickets`` tickets into ``app``'s (empty) database; returns timings."""
+    from sqlalchemy import select, text
+    from app.assignment import assigner
+    from app.cache import support_agents
+    from app.counters import ticket_counters
+    from app.models import db, Ticket, User
+    from app.passwords import passwords
+    from app.sla import sla
+
+    rng = random.Random(random_seed)
+    report = {'users': users, 'tickets': tickets, 'random_seed': random_seed}
+    with app.app_context():
+        started = time.perf_counter()
+        seed_users(db, User, users, passwords.hash(PASSWORD))
+        clients = db.session.execute(select(User.id).where(User.role == 'client').order_by(User.id)).scalars().all()
+        agents = db.session.execute(select(User.id).where(User.role == 'support').order_by(User.id)).scalars().all()
+        for offset in range(0, tickets, batch_size):
+            db.session.execute(Ticket.__table__.insert(), ticket_rows(
+                offset, min(tickets, offset + batch_size), tickets, clients, agents, rng, days, sla))
+            db.session.commit()
+            if progress:
+                progress(min(tickets, offset + batch_size), tickets)
+        report['insert_seconds'] = time.perf_counter() - started
+        started = time.perf_counter()
+        ticket_counters.reconcile()
+        if db.engine.dialect.name == 'sqlite':
+            db.session.execute(text('ANALYZE'))
+            db.session.commit()
+        support_agents.invalidate()  # the users went in with a bulk INSERT
+        if assigner.enabled:
+            assigner.rebuild()
+        report['finish_seconds'] = time.perf_counter() - started
+    return report
+
+
+def print_progress(done, total):
+    print('%d/%d tickets' % (done, total), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help='database URL to fill (default: a throwaway SQLite file)')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--tickets', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=730, help='how far back ticket creation dates go')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    app = bench_app(args.database)
+    report = seed(app, args.users, args.tickets, args.seed, args.days, args.batch_size, print_progress)
+    report['database'] = app.config['SQLALCHEMY_DATABASE_URI']
+    emit(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
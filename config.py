@@ -4,3 +4,87 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///supportportal.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # pragmas run on each SQLite connection: wal (concurrent readers, cheap commits) or none;
+    # SQLITE_PRAGMAS overrides single values, e.g. {'busy_timeout': 10000}
+    SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE') or 'wal'
+    SQLITE_PRAGMAS = {}
+    # connection pool; unset values use the per-dialect defaults in app/database.py and
+    # SQLALCHEMY_ENGINE_OPTIONS, if set, overrides both
+    DB_POOL_SIZE = os.environ.get('DB_POOL_SIZE')
+    DB_MAX_OVERFLOW = os.environ.get('DB_MAX_OVERFLOW')
+    DB_POOL_TIMEOUT = os.environ.get('DB_POOL_TIMEOUT')
+    DB_POOL_RECYCLE = os.environ.get('DB_POOL_RECYCLE')
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING')
+    # milliseconds a statement may run on PostgreSQL/MySQL (SELECTs only on MySQL); 0 disables
+    DB_STATEMENT_TIMEOUT = os.environ.get('DB_STATEMENT_TIMEOUT')
+    TICKETS_PER_PAGE = int(os.environ.get('TICKETS_PER_PAGE') or 25)
+    COMMENTS_PER_PAGE = int(os.environ.get('COMMENTS_PER_PAGE') or 20)
+    # full-text search ranks only the newest N matches of a query; 0 ranks them all
+    SEARCH_RANK_WINDOW = int(os.environ.get('SEARCH_RANK_WINDOW') or 5000)
+    # support users for the assignment dropdown, API assignee checks and auto-assignment. It is
+    # per worker and a role change only clears it in the worker that made it, so keep it short
+    SUPPORT_AGENT_CACHE_TTL = int(os.environ.get('SUPPORT_AGENT_CACHE_TTL') or 5)
+    # user identity cache for login_manager.user_loader: lru, redis (shared across workers) or none.
+    # A change to a user only evicts the lru entry in the worker that made it; the others serve
+    # the old role until USER_CACHE_TTL runs out, so lru entries live seconds, not minutes
+    USER_CACHE_BACKEND = os.environ.get('USER_CACHE_BACKEND') or 'lru'
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE') or 1024)
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or (5 if USER_CACHE_BACKEND == 'lru' else 300))
+    USER_CACHE_URL = os.environ.get('USER_CACHE_URL') or 'redis://localhost:6379/0'
+    # password KDF as a Werkzeug method string; hashes made with other parameters are
+    # upgraded on the user's next login. Hashing runs on PASSWORD_HASH_WORKERS processes
+    # per web worker (0 = in the request thread) with at most PASSWORD_HASH_QUEUE jobs in
+    # flight; further logins get a 503 instead of waiting. The pool only helps threaded
+    # workers (WEB_THREADS > 1), whose other threads keep serving while a hash runs; a
+    # sync worker waits for the hash either way, so there it defaults to 0
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:600000'
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS')
+                                or (1 if int(os.environ.get('WEB_THREADS') or 1) > 1 else 0))
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE') or 8)
+    PASSWORD_HASH_TIMEOUT = int(os.environ.get('PASSWORD_HASH_TIMEOUT') or 10)
+    # token buckets on login/register POSTs as 'count/period' (second, minute, hour, day);
+    # memory is per worker process, redis shares the buckets between workers
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', '1') != '0'
+    RATELIMIT_STORAGE = os.environ.get('RATELIMIT_STORAGE') or 'memory'
+    RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL') or 'redis://localhost:6379/0'
+    RATELIMIT_LOGIN_PER_IP = os.environ.get('RATELIMIT_LOGIN_PER_IP') or '20/minute'
+    RATELIMIT_LOGIN_PER_USERNAME = os.environ.get('RATELIMIT_LOGIN_PER_USERNAME') or '5/minute'
+    RATELIMIT_REGISTER_PER_IP = os.environ.get('RATELIMIT_REGISTER_PER_IP') or '10/hour'
+    # live ticket feed on All Tickets (Server-Sent Events). Each open stream holds a worker
+    # thread, so run gunicorn with WEB_THREADS above SSE_MAX_SUBSCRIBERS; sync workers answer
+    # 503 and the page doesn't connect. A listener more than SSE_QUEUE_SIZE events behind is
+    # dropped and its page reloads. Streams end after SSE_STREAM_TIMEOUT seconds and the
+    # browser reconnects
+    SSE_QUEUE_SIZE = int(os.environ.get('SSE_QUEUE_SIZE') or 100)
+    SSE_HEARTBEAT = int(os.environ.get('SSE_HEARTBEAT') or 15)
+    SSE_MAX_SUBSCRIBERS = int(os.environ.get('SSE_MAX_SUBSCRIBERS') or 20)
+    SSE_STREAM_TIMEOUT = int(os.environ.get('SSE_STREAM_TIMEOUT') or 300)
+    # give each new ticket to the support user with the lowest load, counting their open and
+    # in-progress tickets weighted by priority. Loads are re-read from the ticket_counter table
+    # before a pick once AUTO_ASSIGN_REBUILD_INTERVAL seconds have passed; the default 0 re-reads
+    # before every pick, since other workers' assignments only show up there
+    AUTO_ASSIGN = os.environ.get('AUTO_ASSIGN', '1') != '0'
+    AUTO_ASSIGN_WEIGHTS = {'high': 3, 'medium': 2, 'low': 1}
+    AUTO_ASSIGN_REBUILD_INTERVAL = int(os.environ.get('AUTO_ASSIGN_REBUILD_INTERVAL') or 0)
+    # hours to resolve a ticket, by priority; the work queue lists active tickets that are
+    # overdue or due within SLA_WARNING_MINUTES. Overdue tickets are flagged every
+    # SLA_SWEEP_INTERVAL seconds by whichever worker holds the sweep lease (0 = only by
+    # `flask sla-sweep`, e.g. from cron), SLA_SWEEP_BATCH per commit
+    SLA_POLICIES = {'high': 4, 'medium': 24, 'low': 72}
+    SLA_WARNING_MINUTES = int(os.environ.get('SLA_WARNING_MINUTES') or 60)
+    SLA_SWEEP_INTERVAL = int(os.environ.get('SLA_SWEEP_INTERVAL') or 60)
+    SLA_SWEEP_BATCH = int(os.environ.get('SLA_SWEEP_BATCH') or 500)
+    # per-endpoint timing of requests, SQL statements and template rendering (off by default);
+    # requests slower than PROFILE_SLOW_MS are logged with their slowest statements and
+    # percentiles cover each endpoint's last PROFILE_WINDOW requests
+    PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', '0') != '0'
+    PROFILE_SLOW_MS = int(os.environ.get('PROFILE_SLOW_MS') or 500)
+    PROFILE_WINDOW = int(os.environ.get('PROFILE_WINDOW') or 1000)
+    # Prometheus metrics at /metrics (needs prometheus_client); in-flight, pool and cache gauges are
+    # refreshed at most every METRICS_GAUGE_INTERVAL seconds per worker. With METRICS_TOKEN
+    # set, scrapes must send `Authorization: Bearer <token>`
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+    METRICS_GAUGE_INTERVAL = int(os.environ.get('METRICS_GAUGE_INTERVAL') or 5)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # apply the idempotent schema upgrade on start; set to 0 and run `flask upgrade-schema` instead
+    AUTO_UPGRADE_SCHEMA = os.environ.get('AUTO_UPGRADE_SCHEMA', '1') != '0'
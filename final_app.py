@@ -12,22 +12,37 @@ from datetime import datetime
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 
-from flask import Flask, render_template_string, request, redirect, url_for, flash
+from flask import Flask, abort, request, redirect, url_for, flash
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import defer, joinedload, validates
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
+from app.models import (SUMMARY_LENGTH, backfill_comment_count, backfill_last_activity, backfill_summary,
+                        default_last_activity, summarize, track_comment_counts)
+from app.pagination import keyset_paginate
+from app.schema import schema_lock, upgrade_schema
+from app.database import configure_sqlite, sqlite_pragmas
+from app.cache import UserCache
+from app.counters import PRIORITIES, STATUSES, TicketCounters
+from app.ratelimit import RateLimiter
+from app.sla import SLATracker
+from app.templating import InlineTemplates
 
 # Create Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'supportportal-secret-key-2025'
 app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(current_dir, "supportportal.db")}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# SQLite pragmas: the wal or none profile of app/database.py
+app.config['SQLITE_PROFILE'] = os.environ.get('SQLITE_PROFILE') or 'wal'
+app.config['SQLITE_PRAGMAS'] = {}
 
 # Initialize extensions
 db = SQLAlchemy(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
+templates = InlineTemplates(app)
 
 # Models
 class User(UserMixin, db.Model):
@@ -44,28 +59,74 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
 
 class Ticket(db.Model):
+    __table_args__ = (
+        db.Index('ix_ticket_created', 'created_at'),
+        db.Index('ix_ticket_user_created', 'user_id', 'created_at'),
+        db.Index('ix_ticket_status_priority_created', 'status', 'priority', 'created_at'),
+        db.Index('ix_ticket_status_due', 'status', 'due_at'),
+        db.Index('ix_ticket_status_breached_due', 'status', 'sla_breached', 'due_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=False)
+    summary = db.Column(db.String(SUMMARY_LENGTH + 3), info={'backfill': backfill_summary})
     status = db.Column(db.String(20), nullable=False, default='open')
     priority = db.Column(db.String(20), nullable=False, default='medium')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    due_at = db.Column(db.DateTime)
+    sla_breached = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0',
+                              info={'backfill': backfill_comment_count})
+    last_activity_at = db.Column(db.DateTime, default=default_last_activity, info={'backfill': backfill_last_activity})
     
     user = db.relationship('User', backref=db.backref('tickets', lazy=True))
 
+    @validates('description')
+    def _update_summary(self, key, description):
+        self.summary = summarize(description)
+        return description
+
+class Comment(db.Model):
+    __table_args__ = (
+        db.Index('ix_comment_ticket_created', 'ticket_id', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    ticket_id = db.Column(db.Integer, db.ForeignKey('ticket.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    author = db.relationship('User')
+
+track_comment_counts(Comment, Ticket)
+COMMENTS_PER_PAGE = 20
+user_cache = UserCache(db, User)
+limiter = RateLimiter()
+ticket_counters = TicketCounters(db, Ticket)
+sla = SLATracker(db, Ticket)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.load(int(user_id))
 
-# Create database tables
+# Create database tables and add any columns or indexes missing from an older database
 with app.app_context():
-    db.create_all()
+    configure_sqlite(db.engine, sqlite_pragmas(app.config))
+    with schema_lock(db.engine):
+        db.create_all()
+        upgrade_schema(db.engine, db.metadata)
+        ticket_counters.initialize()
+
+# flag overdue tickets in the background once the server takes requests
+app.before_request(lambda: sla.start_sweeper(app))
 
 # Routes
 @app.route('/')
 def index():
-    return render_template_string("""
+    return templates.render("""
 <!DOCTYPE html>
 <html>
 <head>
@@ -140,6 +201,7 @@ def index():
     """)
 
 @app.route('/login', methods=['GET', 'POST'])
+@limiter.limit('login')
 def login():
     if current_user.is_authenticated:
         return redirect('/')
@@ -156,7 +218,7 @@ def login():
         else:
             flash('Invalid username or password')
     
-    return render_template_string("""
+    return templates.render("""
 <!DOCTYPE html>
 <html>
 <head>
@@ -225,7 +287,7 @@ def register():
             flash('Registration successful! Please login.')
             return redirect('/login')
     
-    return render_template_string("""
+    return templates.render("""
 <!DOCTYPE html>
 <html>
 <head>
@@ -289,17 +351,88 @@ def logout():
     flash('You have been logged out.')
     return redirect('/')
 
-@app.route('/dashboard')
-@login_required
-def dashboard():
-    if current_user.role == 'support':
-        tickets = Ticket.query.order_by(Ticket.created_at.desc()).all()
-        title = "Support Dashboard - All Tickets"
-        template = """
+# Dashboard layout and the two role-specific bodies that extend it
+DASHBOARD_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Dashboard - SupportPortal</title>
+    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css" rel="stylesheet">
+</head>
+<body>
+    <nav class="navbar navbar-dark bg-dark">
+        <div class="container">
+            <a class="navbar-brand" href="/">🎫 SupportPortal</a>
+            <div class="navbar-nav ms-auto d-flex flex-row">
+                <a class="nav-link me-3" href="/dashboard">Dashboard</a>
+                <a class="nav-link me-3" href="/submit">New Ticket</a>
+                <a class="nav-link" href="/logout">Logout ({{ current_user.username }})</a>
+            </div>
+        </div>
+    </nav>
+    <div class="container mt-4">
+        <h2>{{ title }}</h2>
+        {% with messages = get_flashed_messages() %}
+            {% if messages %}
+                {% for message in messages %}
+                    <div class="alert alert-info alert-dismissible fade show">
+                        {{ message }}
+                        <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
+                    </div>
+                {% endfor %}
+            {% endif %}
+        {% endwith %}
+        {% block content %}{% endblock %}
+    </div>
+    <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js"></script>
+</body>
+</html>
+"""
+
+SUPPORT_DASHBOARD_HTML = """{% extends "dashboard.html" %}
+{% block content %}
+        <div class="row mb-4">
+            <div class="col-md-3">
+                <div class="card"><div class="card-body text-center">
+                    <h3>{{ counts.total }}</h3><p class="mb-0 text-muted">Total tickets</p>
+                </div></div>
+            </div>
+            <div class="col-md-9">
+                <table class="table table-sm table-bordered mb-0">
+                    <thead><tr><th></th>{% for status in statuses %}<th>{{ status|replace('_', ' ')|title }}</th>{% endfor %}</tr></thead>
+                    <tbody>
+                        {% for priority in priorities %}
+                        <tr>
+                            <th>{{ priority|title }}</th>
+                            {% for status in statuses %}<td>{{ counts.priority.get(priority, {}).get(status, 0) }}</td>{% endfor %}
+                        </tr>
+                        {% endfor %}
+                    </tbody>
+                </table>
+            </div>
+        </div>
+        {% if next_up %}
+        <h4>Next Up</h4>
+        <table class="table table-sm table-bordered mb-4">
+            <thead><tr><th>ID</th><th>Title</th><th>Priority</th><th>Status</th><th>Due</th><th></th></tr></thead>
+            <tbody>
+                {% for ticket in next_up %}
+                <tr class="{{ 'table-danger' if ticket.due_at <= now else 'table-warning' }}">
+                    <td><strong>#{{ ticket.id }}</strong></td>
+                    <td>{{ ticket.title }}</td>
+                    <td>{{ ticket.priority }}</td>
+                    <td>{{ ticket.status }}</td>
+                    <td>{{ ticket.due_at.strftime('%Y-%m-%d %H:%M') }}</td>
+                    <td><a href="/ticket/{{ ticket.id }}" class="btn btn-sm btn-primary">View</a></td>
+                </tr>
+                {% endfor %}
+            </tbody>
+        </table>
+        {% endif %}
         <div class="table-responsive">
             <table class="table table-hover">
                 <thead class="table-dark">
-                    <tr><th>ID</th><th>Title</th><th>Client</th><th>Status</th><th>Priority</th><th>Created</th><th>Actions</th></tr>
+                    <tr><th>ID</th><th>Title</th><th>Client</th><th>Status</th><th>Priority</th><th>Created</th><th>Replies</th><th>Last Activity</th><th>Actions</th></tr>
                 </thead>
                 <tbody>
                     {% for ticket in tickets %}
@@ -310,17 +443,19 @@ def dashboard():
                         <td><span class="badge bg-{% if ticket.status=='open' %}danger{% elif ticket.status=='in_progress' %}warning{% else %}success{% endif %}">{{ ticket.status }}</span></td>
                         <td><span class="badge bg-{% if ticket.priority=='high' %}danger{% elif ticket.priority=='medium' %}warning{% else %}secondary{% endif %}">{{ ticket.priority }}</span></td>
                         <td>{{ ticket.created_at.strftime('%Y-%m-%d %H:%M') }}</td>
+                        <td>{{ ticket.comment_count }}</td>
+                        <td>{{ ticket.last_activity_at.strftime('%Y-%m-%d %H:%M') }}</td>
                         <td><a href="/ticket/{{ ticket.id }}" class="btn btn-sm btn-primary">View</a></td>
                     </tr>
                     {% endfor %}
                 </tbody>
             </table>
         </div>
-        """
-    else:
-        tickets = Ticket.query.filter_by(user_id=current_user.id).order_by(Ticket.created_at.desc()).all()
-        title = "My Tickets"
-        template = """
+{% endblock %}
+"""
+
+CLIENT_DASHBOARD_HTML = """{% extends "dashboard.html" %}
+{% block content %}
         <div class="d-flex justify-content-between mb-3">
             <span><strong>{{ tickets|length }}</strong> ticket(s) found</span>
             <a href="/submit" class="btn btn-success">+ New Ticket</a>
@@ -332,11 +467,12 @@ def dashboard():
                         <div class="card border-{% if ticket.priority=='high' %}danger{% elif ticket.priority=='medium' %}warning{% else %}secondary{% endif %}">
                             <div class="card-body">
                                 <h5 class="card-title">{{ ticket.title }}</h5>
-                                <p class="card-text">{{ ticket.description[:150] }}{% if ticket.description|length > 150 %}...{% endif %}</p>
+                                <p class="card-text">{{ ticket.summary }}</p>
                                 <p class="text-muted"><small>
                                     <span class="badge bg-{% if ticket.status=='open' %}danger{% elif ticket.status=='in_progress' %}warning{% else %}success{% endif %}">{{ ticket.status }}</span>
                                     <span class="badge bg-{% if ticket.priority=='high' %}danger{% elif ticket.priority=='medium' %}warning{% else %}secondary{% endif %}">{{ ticket.priority }}</span>
                                     {{ ticket.created_at.strftime('%Y-%m-%d %H:%M') }}
+                                    {% if ticket.comment_count %}&middot; {{ ticket.comment_count }} {{ 'reply' if ticket.comment_count == 1 else 'replies' }}, last {{ ticket.last_activity_at.strftime('%Y-%m-%d %H:%M') }}{% endif %}
                                 </small></p>
                                 <a href="/ticket/{{ ticket.id }}" class="btn btn-primary btn-sm">View Details</a>
                             </div>
@@ -353,44 +489,22 @@ def dashboard():
                 </div>
             </div>
         {% endif %}
-        """
-    
-    return render_template_string(f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Dashboard - SupportPortal</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css" rel="stylesheet">
-</head>
-<body>
-    <nav class="navbar navbar-dark bg-dark">
-        <div class="container">
-            <a class="navbar-brand" href="/">🎫 SupportPortal</a>
-            <div class="navbar-nav ms-auto d-flex flex-row">
-                <a class="nav-link me-3" href="/dashboard">Dashboard</a>
-                <a class="nav-link me-3" href="/submit">New Ticket</a>
-                <a class="nav-link" href="/logout">Logout ({{{{ current_user.username }}}})</a>
-            </div>
-        </div>
-    </nav>
-    <div class="container mt-4">
-        <h2>{title}</h2>
-        {{% with messages = get_flashed_messages() %}}
-            {{% if messages %}}
-                {{% for message in messages %}}
-                    <div class="alert alert-info alert-dismissible fade show">
-                        {{{{ message }}}}
-                        <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
-                    </div>
-                {{% endfor %}}
-            {{% endif %}}
-        {{% endwith %}}
-        {template}
-    </div>
-    <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js"></script>
-</body>
-</html>
-    """, tickets=tickets)
+{% endblock %}
+"""
+
+templates.register('dashboard.html', DASHBOARD_HTML)
+
+@app.route('/dashboard')
+@login_required
+def dashboard():
+    if current_user.role == 'support':
+        tickets = Ticket.query.options(joinedload(Ticket.user), defer(Ticket.description)).order_by(Ticket.created_at.desc()).all()
+        next_up = sla.next_up(10, Ticket.query.options(joinedload(Ticket.user), defer(Ticket.description)))
+        return templates.render(SUPPORT_DASHBOARD_HTML, tickets=tickets, title="Support Dashboard - All Tickets",
+                                counts=ticket_counters.summary(), statuses=STATUSES, priorities=PRIORITIES,
+                                next_up=next_up, now=datetime.utcnow())
+    tickets = Ticket.query.options(defer(Ticket.description)).filter_by(user_id=current_user.id).order_by(Ticket.created_at.desc()).all()
+    return templates.render(CLIENT_DASHBOARD_HTML, tickets=tickets, title="My Tickets")
 
 @app.route('/submit', methods=['GET', 'POST'])
 @login_required
@@ -406,7 +520,7 @@ def submit_ticket():
         flash(f'Ticket "{title}" submitted successfully!')
         return redirect('/dashboard')
     
-    return render_template_string("""
+    return templates.render("""
 <!DOCTYPE html>
 <html>
 <head>
@@ -468,8 +582,15 @@ def view_ticket(ticket_id):
     if current_user.role != 'support' and ticket.user_id != current_user.id:
         flash('Access denied - You can only view your own tickets')
         return redirect('/dashboard')
+    # the newest page of replies comes from the (ticket_id, created_at) index; shown oldest first
+    try:
+        comments = keyset_paginate(Comment.query.filter_by(ticket_id=ticket.id).options(joinedload(Comment.author)),
+                                   Comment.created_at, Comment.id, per_page=COMMENTS_PER_PAGE,
+                                   after=request.args.get('after'), before=request.args.get('before'))
+    except ValueError:
+        abort(400)
     
-    return render_template_string("""
+    return templates.render("""
 <!DOCTYPE html>
 <html>
 <head>
@@ -531,6 +652,33 @@ def view_ticket(ticket_id):
                         </div>
                     </div>
                 </div>
+                <div class="card mt-3">
+                    <div class="card-header">
+                        <h5>💬 Conversation <small class="text-muted">{{ ticket.comment_count }} {{ 'reply' if ticket.comment_count == 1 else 'replies' }}</small></h5>
+                    </div>
+                    <div class="card-body">
+                        {% if comments.has_next %}
+                            <p><a href="/ticket/{{ ticket.id }}?after={{ comments.next_cursor }}">&laquo; Older replies</a></p>
+                        {% endif %}
+                        {% for comment in comments.items|reverse %}
+                            <div class="border-bottom mb-2 pb-2">
+                                <small class="text-muted"><strong>{{ comment.author.username }}</strong> {{ comment.created_at.strftime('%Y-%m-%d %H:%M') }}</small>
+                                <p class="mb-0">{{ comment.body }}</p>
+                            </div>
+                        {% else %}
+                            <p class="text-muted">No replies yet.</p>
+                        {% endfor %}
+                        {% if comments.has_prev %}
+                            <p><a href="/ticket/{{ ticket.id }}?before={{ comments.prev_cursor }}">Newer replies &raquo;</a></p>
+                        {% endif %}
+                        <form method="POST" action="/ticket/{{ ticket.id }}/comments">
+                            <div class="mb-3">
+                                <textarea name="body" class="form-control" rows="3" maxlength="10000" required placeholder="Write a reply"></textarea>
+                            </div>
+                            <button type="submit" class="btn btn-primary">Post Reply</button>
+                        </form>
+                    </div>
+                </div>
             </div>
             <div class="col-md-4">
                 {% if current_user.role == 'support' %}
@@ -562,7 +710,23 @@ def view_ticket(ticket_id):
     <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js"></script>
 </body>
 </html>
-    """, ticket=ticket)
+    """, ticket=ticket, comments=comments)
+
+@app.route('/ticket/<int:ticket_id>/comments', methods=['POST'])
+@login_required
+def add_comment(ticket_id):
+    ticket = Ticket.query.get_or_404(ticket_id)
+    if current_user.role != 'support' and ticket.user_id != current_user.id:
+        flash('Access denied - You can only reply to your own tickets')
+        return redirect('/dashboard')
+    body = request.form.get('body', '').strip()
+    if not body or len(body) > 10000:
+        flash('A reply must have between 1 and 10000 characters')
+    else:
+        db.session.add(Comment(ticket_id=ticket.id, user_id=current_user.id, body=body))
+        db.session.commit()
+        flash('Reply posted')
+    return redirect(f'/ticket/{ticket_id}')
 
 @app.route('/update/<int:ticket_id>', methods=['POST'])
 @login_required
@@ -0,0 +1,80 @@
+"""Gunicorn settings for serving ``wsgi:app``.
+
+Every value can be overridden from the environment (or on the command line):
+
+    WEB_CONCURRENCY   worker processes (default: 2 x CPUs + 1)
+    WEB_THREADS       threads per worker; above 1 uses the gthread worker (default: 1)
+    BIND              listen address (default: 0.0.0.0:8000)
+    PROMETHEUS_MULTIPROC_DIR
+                      where workers write their /metrics samples (default: a
+                      fresh directory under the system temp dir per master)
+
+The app is imported once in the master and the workers are forked from it, so
+they share its memory pages instead of each importing Flask and SQLAlchemy.
+``kill -HUP <master>`` replaces the workers gracefully; with preloading that
+does not pick up new code, use ``kill -USR2`` to re-exec the master for that.
+"""
+import gc
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = os.environ.get('BIND') or '0.0.0.0:8000'
+workers = int(os.environ.get('WEB_CONCURRENCY') or multiprocessing.cpu_count() * 2 + 1)
+threads = int(os.environ.get('WEB_THREADS') or 1)
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 30)
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT') or 30)
+keepalive = 5
+# recycle workers now and then so slow leaks can't build up; the jitter keeps
+# them from all restarting at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS') or 5000)
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+
+# Each worker writes its Prometheus samples to files here and /metrics merges
+# them. It has to be set before the app (and prometheus_client) is imported.
+if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='supportportal-metrics-')
+    _own_metrics_dir = True
+else:
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+    _own_metrics_dir = False
+
+
+def when_ready(server):
+    # Move everything the preloaded app allocated into the permanent generation.
+    # The collector then never touches those objects in a worker, so it doesn't
+    # write to (and un-share) the pages they live on.
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Connections opened in the master (schema checks at import) must not be
+    # shared with the children; drop them from the pool without closing them,
+    # which would close the master's socket/file handle too.
+    if preload_app:
+        from app.models import db
+        from wsgi import app
+        with app.app_context():
+            db.engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    # drop the dead worker's live gauges (in-flight requests, pool, caches)
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    if _own_metrics_dir:
+        shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
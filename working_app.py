@@ -15,16 +15,23 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 
 # Import Flask modules
-from flask import Flask, render_template_string, request, redirect, url_for, flash
+from flask import Flask, request, redirect, url_for, flash
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import joinedload
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
+from app.cache import UserCache
+from app.database import configure_sqlite, sqlite_pragmas
+from app.templating import InlineTemplates
 
 # Configuration
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'supportportal-secret-key-2025'
 app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(current_dir, "supportportal.db")}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# SQLite pragmas: the wal or none profile of app/database.py
+app.config['SQLITE_PROFILE'] = os.environ.get('SQLITE_PROFILE') or 'wal'
+app.config['SQLITE_PRAGMAS'] = {}
 
 # Initialize extensions
 db = SQLAlchemy(app)
@@ -59,14 +66,17 @@ class Ticket(db.Model):
     
     user = db.relationship('User', backref=db.backref('tickets', lazy=True))
 
+user_cache = UserCache(db, User)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.load(int(user_id))
 
 print("✓ Database models defined")
 
 # Create database tables
 with app.app_context():
+    configure_sqlite(db.engine, sqlite_pragmas(app.config))
     try:
         db.create_all()
         print("✓ Database tables created successfully")
@@ -124,6 +134,10 @@ BASE_HTML = """
 </html>
 """
 
+# Page templates extend "base.html" and are compiled once, not on every request
+templates = InlineTemplates(app)
+templates.register('base.html', BASE_HTML)
+
 # Routes
 @app.route('/')
 def index():
@@ -163,7 +177,7 @@ def index():
     </div>
     {% endblock %}
     """
-    return render_template_string(BASE_HTML.replace("{% block content %}{% endblock %}", content))
+    return templates.render(content)
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -208,7 +222,7 @@ def login():
     </div>
     {% endblock %}
     """
-    return render_template_string(BASE_HTML.replace("{% block content %}{% endblock %}", content))
+    return templates.render(content)
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -270,7 +284,7 @@ def register():
     </div>
     {% endblock %}
     """
-    return render_template_string(BASE_HTML.replace("{% block content %}{% endblock %}", content))
+    return templates.render(content)
 
 @app.route('/logout')
 @login_required
@@ -283,7 +297,7 @@ def logout():
 @login_required
 def dashboard():
     if current_user.role == 'support':
-        tickets = Ticket.query.all()
+        tickets = Ticket.query.options(joinedload(Ticket.user)).all()
         content = """
         {% extends "base.html" %}
         {% block content %}
@@ -353,7 +367,7 @@ def dashboard():
         {% endblock %}
         """
     
-    return render_template_string(BASE_HTML.replace("{% block content %}{% endblock %}", content), tickets=tickets)
+    return templates.render(content, tickets=tickets)
 
 @app.route('/submit', methods=['GET', 'POST'])
 @login_required
@@ -403,7 +417,7 @@ def submit_ticket():
     </div>
     {% endblock %}
     """
-    return render_template_string(BASE_HTML.replace("{% block content %}{% endblock %}", content))
+    return templates.render(content)
 
 @app.route('/ticket/<int:ticket_id>')
 @login_required
@@ -465,7 +479,7 @@ def view_ticket(ticket_id):
     </div>
     {% endblock %}
     """
-    return render_template_string(BASE_HTML.replace("{% block content %}{% endblock %}", content), ticket=ticket)
+    return templates.render(content, ticket=ticket)
 
 @app.route('/update/<int:ticket_id>', methods=['POST'])
 @login_required